@@ -515,7 +515,7 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 
 
 #Full demo walkthrough
-points = load_gpx_points("001-multiuse-all-uses (1).gpx")
+#(we reuse the points loaded in Part 1, parsing the same file again is wasted work)
 def compute_trail_stats(points):
     
     total_distance = 0.0
@@ -911,8 +911,7 @@ def save_trail_csv(filename, rows):
 # In[37]:
 
 
-#Load gpx
-points = load_gpx_points("001-multiuse-all-uses (1).gpx")
+#Reuse the gpx points from Part 1
 print("Number of raw points:", len(points))
 
 #Build the trail table stats
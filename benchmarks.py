@@ -0,0 +1,160 @@
+# benchmarks.py
+# Small timing scripts for gpx_pipeline. Run with:
+#     python benchmarks.py            (all benchmarks)
+#     python benchmarks.py kernel     (just one)
+# Each benchmark prints the best of a few runs, so other programs running on
+# the machine disturb the numbers less.
+
+import math
+import random
+import sys
+import time
+
+import gpx_pipeline
+
+
+def synthetic_points(n, seed=0):
+    # a wandering track around the sample trail, 1 point per second
+    rng = random.Random(seed)
+    lat, lon, ele = 38.21371, -87.22078, 168.3
+    heading = 0.0
+    points = []
+    for i in range(n):
+        heading += rng.uniform(-0.3, 0.3)
+        step = rng.uniform(2.0, 6.0) / 111000.0
+        lat += step * math.cos(heading)
+        lon += step * math.sin(heading) / math.cos(math.radians(lat))
+        ele += rng.uniform(-0.5, 0.5)
+        points.append({
+            "lat": lat,
+            "lon": lon,
+            "ele": ele,
+            "time": "2025-11-12T%02d:%02d:%02dZ" % ((i // 3600) % 24, (i // 60) % 60, i % 60)
+        })
+    return points
+
+
+def best_of(func, repeat=3):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# ---------------------------------------------------------------------------
+# Reading: the memory-mapped scanner vs the two ElementTree readers
+# ---------------------------------------------------------------------------
+
+def bench_reader(n=200000):
+    import os
+    import tempfile
+
+    fd, gpx_path = tempfile.mkstemp(suffix=".gpx")
+    os.close(fd)
+    try:
+        gpx_pipeline.write_gpx(gpx_path, [gpx_pipeline.points_to_columns(synthetic_points(n))])
+        tree = best_of(lambda: gpx_pipeline.load_gpx_points(gpx_path))
+        stream = best_of(lambda: list(gpx_pipeline.iter_gpx_points(gpx_path)))
+        scan = best_of(lambda: gpx_pipeline.load_gpx_columns(gpx_path))
+    finally:
+        os.remove(gpx_path)
+    print("reader  %d points: load_gpx_points %.3fs, iter_gpx_points %.3fs, "
+          "load_gpx_columns %.3fs (%.1fx)" % (n, tree, stream, scan, stream / scan))
+
+
+# ---------------------------------------------------------------------------
+# Trail math: the fused kernel vs the two separate haversine passes
+# ---------------------------------------------------------------------------
+
+def _two_pass_stats_and_table(points):
+    # what the tutorial did: compute_trail_stats() and build_trail_table()
+    # each walk all the points through haversine_distance()
+    haversine = gpx_pipeline.haversine_distance
+
+    total_distance = 0.0
+    total_gain = 0.0
+    for i in range(1, len(points)):
+        p1 = points[i - 1]
+        p2 = points[i]
+        total_distance += haversine(p1["lat"], p1["lon"], p2["lat"], p2["lon"])
+        if p1["ele"] is not None and p2["ele"] is not None and p2["ele"] > p1["ele"]:
+            total_gain += p2["ele"] - p1["ele"]
+
+    rows = []
+    total_distance = 0.0
+    total_gain = 0.0
+    for i, p in enumerate(points):
+        seg_dist = 0.0
+        seg_gain = 0.0
+        if i > 0:
+            q = points[i - 1]
+            seg_dist = haversine(q["lat"], q["lon"], p["lat"], p["lon"])
+            total_distance += seg_dist
+            if q["ele"] is not None and p["ele"] is not None and p["ele"] > q["ele"]:
+                seg_gain = p["ele"] - q["ele"]
+                total_gain += seg_gain
+        rows.append({
+            "index": i, "lat": p["lat"], "lon": p["lon"], "ele": p["ele"], "time": p["time"],
+            "seg_dist_m": seg_dist, "cum_dist_m": total_distance,
+            "seg_gain_m": seg_gain, "cum_gain_m": total_gain
+        })
+    return rows, total_distance, total_gain
+
+
+def bench_kernel(n=200000):
+    points = synthetic_points(n)
+    old = best_of(lambda: _two_pass_stats_and_table(points))
+    new = best_of(lambda: gpx_pipeline.build_trail_table(points))
+    print("kernel  %d points: two passes %.3fs, fused %.3fs (%.2fx)" % (n, old, new, old / new))
+
+
+# ---------------------------------------------------------------------------
+# Workers: sending points to worker processes, pickled vs shared memory
+# ---------------------------------------------------------------------------
+
+def _pickled_worker(points):
+    return len(points)
+
+
+def _shared_worker(descriptor):
+    with gpx_pipeline.attached_columns(descriptor) as cols:
+        return len(cols["lat"])
+
+
+def bench_shared_memory(n=500000, workers=4):
+    # Hands the same track to `workers` tasks (think stats, smoothing and
+    # segmentation passes) and times only the hand-over: each task just
+    # counts the points, so what is measured is the pickling vs attaching.
+    from concurrent.futures import ProcessPoolExecutor
+
+    points = synthetic_points(n)
+    columns = gpx_pipeline.points_to_columns(points)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_pickled_worker, [[]] * workers))  # start the workers first
+
+        pickled = best_of(lambda: list(pool.map(_pickled_worker, [points] * workers)))
+
+        def shared():
+            with gpx_pipeline.shared_columns(columns) as descriptor:
+                list(pool.map(_shared_worker, [descriptor] * workers))
+
+        attached = best_of(shared)
+
+    print("shm     %d points x %d workers: pickled %.3fs, shared memory %.3fs (%.1fx)"
+          % (n, workers, pickled, attached, pickled / attached))
+
+
+BENCHMARKS = {
+    "reader": bench_reader,
+    "kernel": bench_kernel,
+    "shm": bench_shared_memory
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,111 @@
+# gpx_async.py
+# The pipeline for asyncio programs (for example a web service that receives
+# GPX uploads). ET.parse() and plain file writes block, and while they run the
+# event loop cannot serve anyone else. Here the bytes are read with await, fed
+# chunk by chunk into ET.XMLPullParser, and the CPU-heavy steps (parsing a
+# chunk, building the table, writing the CSV) run in an executor.
+#
+#     async for point in aload_gpx_points(stream):
+#         ...
+#     await aconvert("ride.gpx", "ride.csv")
+#
+# Backpressure comes for free: aload_gpx_points() only reads the next chunk
+# when the consumer asks for more points, and aconvert_many() caps how many
+# conversions run at the same time.
+
+import asyncio
+import os
+import xml.etree.ElementTree as ET
+
+import gpx_pipeline
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def _iter_chunks(stream, chunk_size):
+    # stream is either something with "async def read(n)" (like
+    # asyncio.StreamReader or aiohttp's request.content) or an async iterator
+    # of bytes chunks
+    if hasattr(stream, "read"):
+        while True:
+            data = await stream.read(chunk_size)
+            if not data:
+                return
+            yield data
+    else:
+        async for data in stream:
+            if data:
+                yield data
+
+
+async def _iter_file_chunks(path, chunk_size, executor=None):
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(executor, open, path, "rb")
+    try:
+        while True:
+            data = await loop.run_in_executor(executor, f.read, chunk_size)
+            if not data:
+                return
+            yield data
+    finally:
+        await loop.run_in_executor(executor, f.close)
+
+
+def _feed(parser, data):
+    # runs in the executor: parse one chunk, return the points it finished
+    if data is None:
+        parser.close()
+    else:
+        parser.feed(data)
+
+    points = []
+    for _, elem in parser.read_events():
+        if gpx_pipeline._local_name(elem.tag) != "trkpt":
+            continue
+        point = gpx_pipeline.trkpt_point(elem)
+        elem.clear()
+        if point is not None:
+            points.append(point)
+    return points
+
+
+async def aload_gpx_points(stream, chunk_size=CHUNK_SIZE, executor=None):
+    # stream may also be a file path (str or pathlib.Path)
+    loop = asyncio.get_running_loop()
+    parser = ET.XMLPullParser(events=("end",))
+
+    if isinstance(stream, (str, os.PathLike)):
+        chunks = _iter_file_chunks(os.fspath(stream), chunk_size, executor)
+    else:
+        chunks = _iter_chunks(stream, chunk_size)
+
+    async for data in chunks:
+        for point in await loop.run_in_executor(executor, _feed, parser, data):
+            yield point
+
+    for point in await loop.run_in_executor(executor, _feed, parser, None):
+        yield point
+
+
+async def aconvert(src, dst, executor=None):
+    # src: GPX path or async byte stream, dst: CSV path.
+    # Returns (total_distance, total_gain, avg_grade) like compute_trail_stats().
+    loop = asyncio.get_running_loop()
+
+    points = [point async for point in aload_gpx_points(src, executor=executor)]
+    rows, total_distance, total_gain, avg_grade = await loop.run_in_executor(
+        executor, gpx_pipeline.build_trail_table, points)
+    await loop.run_in_executor(executor, gpx_pipeline.save_trail_csv, dst, rows)
+    return total_distance, total_gain, avg_grade
+
+
+async def aconvert_many(jobs, limit=16, executor=None):
+    # jobs is a list of (src, dst); at most `limit` run at once.
+    # Results come back in the same order as the jobs.
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(src, dst):
+        async with semaphore:
+            return await aconvert(src, dst, executor)
+
+    return await asyncio.gather(*(run(src, dst) for src, dst in jobs))
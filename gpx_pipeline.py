@@ -0,0 +1,1566 @@
+# gpx_pipeline.py
+# The final pipeline from "Project code.py" (Part 4) as a module you can import:
+# read a GPX file, turn the track points into a trail table, save it as a CSV.
+# Like the tutorial, it only uses Python's standard library.
+
+import csv
+import hashlib
+import html
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from contextlib import contextmanager
+from itertools import repeat
+
+R = 6371000  # earth radius in meters
+
+TRAIL_HEADERS = [
+    "index", "lat", "lon", "ele", "time",
+    "seg_dist_m", "cum_dist_m", "seg_gain_m", "cum_gain_m"
+]
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def load_gpx_points(gpx_path):
+    tree = ET.parse(gpx_path)
+    root = tree.getroot()
+
+    # GPX 1.1 files put every tag in a namespace, findall() needs to know it
+    ns = {}
+    if "}" in root.tag:
+        uri = root.tag.split("}")[0].strip("{")
+        ns["gpx"] = uri
+        trkpt_path = ".//gpx:trkpt"
+        ele_tag = "gpx:ele"
+        time_tag = "gpx:time"
+    else:
+        trkpt_path = ".//trkpt"
+        ele_tag = "ele"
+        time_tag = "time"
+
+    points = []
+    for trkpt in root.findall(trkpt_path, ns):
+        lat_text = trkpt.get("lat")
+        lon_text = trkpt.get("lon")
+        if lat_text is None or lon_text is None:
+            continue
+
+        lat = float(lat_text)
+        lon = float(lon_text)
+
+        ele_elem = trkpt.find(ele_tag, ns)
+        ele = float(ele_elem.text) if (ele_elem is not None and ele_elem.text) else None
+
+        time_elem = trkpt.find(time_tag, ns)
+        time_text = time_elem.text.strip() if (time_elem is not None and time_elem.text) else None
+
+        points.append({
+            "lat": lat,
+            "lon": lon,
+            "ele": ele,
+            "time": time_text
+        })
+
+    return points
+
+
+# ---------------------------------------------------------------------------
+# The trail kernel
+#
+# compute_trail_stats() and build_trail_table() used to walk the points twice,
+# each calling haversine_distance(), which converts both ends of every segment
+# to radians and takes cos() of both latitudes. trail_kernel() does it all in
+# one pass: each point is converted to radians once, and the cos() of its
+# latitude is kept for the next segment, where that point is the start.
+# Both public functions are now thin views over it.
+# ---------------------------------------------------------------------------
+
+KERNEL_OUTPUTS = ["seg_dist_m", "cum_dist_m", "seg_gain_m", "cum_gain_m"]
+
+
+def trail_kernel(lats, lons, eles, prev_point=None, total_distance=0.0,
+                 total_gain=0.0, want_table=True, outputs=None):
+    # Returns (seg_dists, cum_dists, seg_gains, cum_gains, total_distance,
+    # total_gain). outputs names the lists to build (default: all four, or
+    # none with want_table=False); the others stay empty. The distance work
+    # is skipped when no distance list is wanted and the gain work when no
+    # gain list is, and then lats/lons or eles may be None. With no lists at
+    # all both totals are computed.
+    if outputs is None:
+        outputs = KERNEL_OUTPUTS if want_table else ()
+    want_seg_dist = "seg_dist_m" in outputs
+    want_cum_dist = "cum_dist_m" in outputs
+    want_seg_gain = "seg_gain_m" in outputs
+    want_cum_gain = "cum_gain_m" in outputs
+    do_dist = want_seg_dist or want_cum_dist or not outputs
+    do_gain = want_seg_gain or want_cum_gain or not outputs
+    if not do_dist:
+        lats = lons = repeat(0.0)
+    if not do_gain:
+        eles = repeat(None)
+
+    sin = math.sin
+    cos = math.cos
+    sqrt = math.sqrt
+    atan2 = math.atan2
+    to_rad = math.pi / 180.0
+
+    seg_dists = []
+    cum_dists = []
+    seg_gains = []
+    cum_gains = []
+
+    if prev_point is None:
+        have_prev = False
+        phi1 = lam1 = cos1 = 0.0
+        ele1 = None
+    else:
+        have_prev = True
+        phi1 = prev_point["lat"] * to_rad
+        lam1 = prev_point["lon"] * to_rad
+        cos1 = cos(phi1)
+        ele1 = prev_point["ele"]
+
+    for lat, lon, ele in zip(lats, lons, eles):
+        seg_dist = 0.0
+        if do_dist:
+            phi2 = lat * to_rad
+            lam2 = lon * to_rad
+            cos2 = cos(phi2)
+            if have_prev:
+                s_phi = sin((phi2 - phi1) * 0.5)
+                s_lam = sin((lam2 - lam1) * 0.5)
+                a = s_phi * s_phi + cos1 * cos2 * s_lam * s_lam
+                seg_dist = 2.0 * R * atan2(sqrt(a), sqrt(1.0 - a))
+                total_distance += seg_dist
+            phi1 = phi2
+            lam1 = lam2
+            cos1 = cos2
+
+        seg_gain = 0.0
+        if have_prev and ele1 is not None and ele is not None and ele > ele1:
+            seg_gain = ele - ele1
+            total_gain += seg_gain
+        ele1 = ele
+        have_prev = True
+
+        if want_seg_dist:
+            seg_dists.append(seg_dist)
+        if want_cum_dist:
+            cum_dists.append(total_distance)
+        if want_seg_gain:
+            seg_gains.append(seg_gain)
+        if want_cum_gain:
+            cum_gains.append(total_gain)
+
+    return seg_dists, cum_dists, seg_gains, cum_gains, total_distance, total_gain
+
+
+def _point_columns(points):
+    return ([p["lat"] for p in points],
+            [p["lon"] for p in points],
+            [p["ele"] for p in points])
+
+
+def compute_trail_stats(points):
+    lats, lons, eles = _point_columns(points)
+    _, _, _, _, total_distance, total_gain = trail_kernel(lats, lons, eles, want_table=False)
+    avg_grade = (total_gain / total_distance) if total_distance > 0 else 0.0
+    return total_distance, total_gain, avg_grade
+
+
+def build_trail_table(points):
+    if len(points) == 0:
+        return [], 0.0, 0.0, 0.0
+
+    lats, lons, eles = _point_columns(points)
+    seg_dists, cum_dists, seg_gains, cum_gains, total_distance, total_gain = trail_kernel(
+        lats, lons, eles)
+
+    rows = [
+        {
+            "index": i,
+            "lat": p["lat"],
+            "lon": p["lon"],
+            "ele": p["ele"],
+            "time": p["time"],
+            "seg_dist_m": seg_dist,
+            "cum_dist_m": cum_dist,
+            "seg_gain_m": seg_gain,
+            "cum_gain_m": cum_gain
+        }
+        for i, (p, seg_dist, cum_dist, seg_gain, cum_gain) in enumerate(
+            zip(points, seg_dists, cum_dists, seg_gains, cum_gains))
+    ]
+
+    avg_grade = (total_gain / total_distance) if total_distance > 0 else 0.0
+    return rows, total_distance, total_gain, avg_grade
+
+
+@contextmanager
+def atomic_write(path, mode="w", **open_kwargs):
+    # Write to a temp file next to path and rename it over path at the end.
+    # A crash half-way leaves the old file (or no file), never half a file.
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_trail_csv(csv_path, rows, headers=TRAIL_HEADERS):
+    with atomic_write(csv_path, "w", newline="", encoding="utf-8") as f:
+        # extra columns a table may carry (like the cached x_m / y_m) are
+        # simply not written
+        writer = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(r)
+
+
+# ---------------------------------------------------------------------------
+# Columnar points and the memory-mapped scanner
+#
+# For big files the list of point dictionaries gets heavy, so the faster
+# readers return "columns" instead: one list per field, all the same length.
+#     {"lat": [...], "lon": [...], "ele": [...], "time": [...]}
+# ele and time keep None for missing values, just like the point dictionaries.
+# ---------------------------------------------------------------------------
+
+POINT_FIELDS = ["lat", "lon", "ele", "time"]
+
+# What the scanner accepts: <trkpt> elements with or without a namespace
+# prefix (<gpx:trkpt>), lat/lon in either quote style and any attribute order,
+# and <ele> / <time> anywhere among the children. Comments and CDATA sections
+# are skipped as a whole, so a commented-out point is not read, and entity or
+# character references (&amp; &#58;) in the values are decoded. It is not an
+# XML parser: it does not check that the file is well-formed, and it ignores
+# everything outside <trkpt> (routes, waypoints, extensions). Use
+# iter_gpx_points() when that matters.
+
+# one whole <trkpt ...>...</trkpt> (or a self-closing <trkpt .../>), or a
+# comment / CDATA section to step over (then group 1 is None)
+TRKPT_RE = re.compile(
+    rb"<!--.*?-->|<!\[CDATA\[.*?\]\]>"
+    rb"|<(?:[\w.-]+:)?trkpt\b([^>]*?)(?:/>|>(.*?)</(?:[\w.-]+:)?trkpt\s*>)",
+    re.S
+)
+# just the start of one, for counting points and cutting the file into ranges
+TRKPT_START_RE = re.compile(rb"<(?:[\w.-]+:)?trkpt\b")
+GPX_END_RE = re.compile(rb"</(?:[\w.-]+:)?gpx\s*>")
+LAT_RE = re.compile(rb"\blat\s*=\s*[\"']([^\"']*)[\"']")
+LON_RE = re.compile(rb"\blon\s*=\s*[\"']([^\"']*)[\"']")
+ELE_RE = re.compile(rb"<(?:[\w.-]+:)?ele\s*>\s*([^<]*?)\s*<")
+TIME_RE = re.compile(rb"<(?:[\w.-]+:)?time\s*>\s*([^<]*?)\s*<")
+
+# The layout almost every writer uses (write_gpx() included), matched in one
+# go so findall() can do the whole loop in C:
+#     <trkpt lat=".." lon=".."><ele>..</ele><time>..</time></trkpt>
+# Values with a "&" in them are left to the general scanner.
+TRKPT_FAST_RE = re.compile(
+    rb'<trkpt\s+lat="([^"&]*)"\s+lon="([^"&]*)"\s*>\s*'
+    rb"(?:<ele>\s*([^<&]*?)\s*</ele>\s*)?"
+    rb"(?:<time>\s*([^<&]*?)\s*</time>\s*)?"
+    rb"</trkpt>"
+)
+
+
+def new_columns(fields=POINT_FIELDS):
+    # lat and lon are always there; ele / time only if asked for
+    return {field: [] for field in POINT_FIELDS if field in ("lat", "lon") or field in fields}
+
+
+def columns_to_points(columns):
+    return [
+        {"lat": lat, "lon": lon, "ele": ele, "time": time_text}
+        for lat, lon, ele, time_text in zip(
+            columns["lat"], columns["lon"], columns["ele"], columns["time"]
+        )
+    ]
+
+
+def points_to_columns(points):
+    columns = new_columns()
+    for field in POINT_FIELDS:
+        columns[field] = [p[field] for p in points]
+    return columns
+
+
+def _xml_value(raw):
+    text = raw.decode("utf-8")
+    return html.unescape(text) if "&" in text else text
+
+
+def _scan_trkpts_fast(buf, start, end, columns):
+    # TRKPT_FAST_RE over [start, end). Returns the offset just after the last
+    # point it read, or None when some <trkpt> in that stretch has another
+    # layout (then nothing is added and the general scanner has to do it).
+    if buf.find(b"<!--", start, end) != -1 or buf.find(b"<![CDATA[", start, end) != -1:
+        return None
+    last_close = buf.rfind(b"</trkpt>", start, end)
+    if last_close == -1:
+        return start
+    stop = last_close + len(b"</trkpt>")
+
+    matches = TRKPT_FAST_RE.findall(buf, start, stop)
+    if len(matches) != len(TRKPT_START_RE.findall(buf, start, stop)):
+        return None
+
+    columns["lat"].extend([float(m[0]) for m in matches])
+    columns["lon"].extend([float(m[1]) for m in matches])
+    if "ele" in columns:
+        columns["ele"].extend([float(m[2]) if m[2] else None for m in matches])
+    if "time" in columns:
+        columns["time"].extend([m[3].decode("utf-8") if m[3] else None for m in matches])
+    return stop
+
+
+def scan_trkpts(buf, start=0, end=None, columns=None):
+    # buf can be bytes or an mmap; re works on both without copying the buffer.
+    # Only the small lat/lon/ele spans get copied, and float() takes bytes
+    # directly so they never become str. Returns the columns and the byte
+    # offset just after the last complete <trkpt> that was read. Fields that
+    # are not keys of columns (see new_columns(fields)) are not even looked at.
+    if end is None:
+        end = len(buf)
+    if columns is None:
+        columns = new_columns()
+
+    # the common layout first; whatever it leaves at the end (usually nothing,
+    # or a point cut off in a growing file) goes through the general loop
+    fast_end = _scan_trkpts_fast(buf, start, end, columns)
+    if fast_end is not None:
+        if fast_end == end or TRKPT_START_RE.search(buf, fast_end, end) is None:
+            return columns, fast_end
+        start = fast_end
+
+    lats = columns["lat"]
+    lons = columns["lon"]
+    eles = columns.get("ele")
+    times = columns.get("time")
+
+    last_end = start
+    for m in TRKPT_RE.finditer(buf, start, end):
+        attrs = m.group(1)
+        if attrs is None:
+            # a comment or CDATA section
+            continue
+        last_end = m.end()
+
+        lat_m = LAT_RE.search(attrs)
+        lon_m = LON_RE.search(attrs)
+        if lat_m is None or lon_m is None:
+            continue
+
+        lat_raw = lat_m.group(1)
+        lon_raw = lon_m.group(1)
+        lat = float(_xml_value(lat_raw) if b"&" in lat_raw else lat_raw)
+        lon = float(_xml_value(lon_raw) if b"&" in lon_raw else lon_raw)
+
+        lats.append(lat)
+        lons.append(lon)
+
+        body = m.group(2)
+        if eles is not None:
+            ele = None
+            if body:
+                ele_m = ELE_RE.search(body)
+                if ele_m is not None and ele_m.group(1):
+                    ele_raw = ele_m.group(1)
+                    ele = float(_xml_value(ele_raw) if b"&" in ele_raw else ele_raw)
+            eles.append(ele)
+        if times is not None:
+            time_text = None
+            if body:
+                time_m = TIME_RE.search(body)
+                if time_m is not None and time_m.group(1):
+                    time_text = _xml_value(time_m.group(1))
+            times.append(time_text)
+
+    return columns, last_end
+
+
+def load_gpx_columns(gpx_path, fields=POINT_FIELDS, require_complete=False):
+    # Memory-map the file instead of reading it: the OS pages it in on demand
+    # and the pages live in the shared page cache, so several worker processes
+    # converting the same file all read the same physical memory.
+    # The scanner does not validate the XML, so a file cut off half-way
+    # simply gives fewer points. With require_complete=True that raises
+    # ValueError instead: there has to be a closing </gpx> after the last
+    # point that was read.
+    with open(gpx_path, "rb") as f:
+        f.seek(0, 2)
+        if f.tell() == 0:
+            if require_complete:
+                raise ValueError("%s: empty file" % (gpx_path,))
+            return new_columns(fields)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            columns, last_end = scan_trkpts(mm, columns=new_columns(fields))
+            if require_complete and GPX_END_RE.search(mm, last_end) is None:
+                raise ValueError("%s: no closing </gpx> after byte %d, the file looks truncated"
+                                 % (gpx_path, last_end))
+    return columns
+
+
+# ---------------------------------------------------------------------------
+# Columnar trail table
+#
+# Same columns as build_trail_table() rows (TRAIL_HEADERS), but stored as one
+# list per column. prev_point/total_distance/total_gain let a table continue
+# from where another one stopped (a chunk border or an earlier run).
+# ---------------------------------------------------------------------------
+
+def build_trail_columns(columns, prev_point=None, total_distance=0.0,
+                        total_gain=0.0, start_index=0):
+    lats = columns["lat"]
+    lons = columns["lon"]
+    eles = columns["ele"]
+
+    seg_dists, cum_dists, seg_gains, cum_gains, total_distance, total_gain = trail_kernel(
+        lats, lons, eles, prev_point, total_distance, total_gain)
+
+    table = {
+        "index": list(range(start_index, start_index + len(lats))),
+        "lat": lats,
+        "lon": lons,
+        "ele": eles,
+        "time": columns["time"],
+        "seg_dist_m": seg_dists,
+        "cum_dist_m": cum_dists,
+        "seg_gain_m": seg_gains,
+        "cum_gain_m": cum_gains
+    }
+    return table, total_distance, total_gain
+
+
+def table_to_rows(table):
+    names = list(table)
+    return [dict(zip(names, values)) for values in zip(*(table[n] for n in names))]
+
+
+def table_last_point(table):
+    if len(table["lat"]) == 0:
+        return None
+    return {field: table[field][-1] for field in POINT_FIELDS}
+
+
+# ---------------------------------------------------------------------------
+# Parallel parsing of one big file
+#
+# The file is cut into byte ranges that each start exactly at a "<trkpt", so
+# no point is ever split. Every range is scanned (and its table built) in its
+# own process, then the chunks are glued back together in order. Only the
+# segment that crosses each border is missing from a chunk, so the parent
+# computes that one segment and shifts the chunk's running totals by it.
+# ---------------------------------------------------------------------------
+
+# below this size the process start-up costs more than it saves
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+
+def split_gpx_ranges(gpx_path, n_parts):
+    with open(gpx_path, "rb") as f:
+        f.seek(0, 2)
+        size = f.tell()
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # a cut inside a comment or CDATA section could land on a
+            # commented-out <trkpt>, so such files are read in one piece
+            if mm.find(b"<!--") != -1 or mm.find(b"<![CDATA[") != -1:
+                n_parts = 1
+            starts = []
+            for k in range(n_parts):
+                m = TRKPT_START_RE.search(mm, k * size // n_parts)
+                if m is None:
+                    break
+                if not starts or m.start() > starts[-1]:
+                    starts.append(m.start())
+
+    if not starts:
+        return []
+    ends = starts[1:] + [size]
+    return list(zip(starts, ends))
+
+
+def _table_for_range(job):
+    gpx_path, start, end = job
+    with open(gpx_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            columns, _ = scan_trkpts(mm, start, end)
+    table, _, _ = build_trail_columns(columns)
+    return table
+
+
+def stitch_trail_tables(tables):
+    stitched = {name: [] for name in TRAIL_HEADERS}
+    total_distance = 0.0
+    total_gain = 0.0
+    prev = None
+
+    for table in tables:
+        n = len(table["lat"])
+        if n == 0:
+            continue
+
+        # the segment across the border, which the chunk could not see
+        border_dist = 0.0
+        border_gain = 0.0
+        if prev is not None:
+            border_dist = haversine_distance(prev["lat"], prev["lon"],
+                                             table["lat"][0], table["lon"][0])
+            if prev["ele"] is not None and table["ele"][0] is not None:
+                border_gain = max(0.0, table["ele"][0] - prev["ele"])
+
+        dist_offset = total_distance + border_dist
+        gain_offset = total_gain + border_gain
+        index_offset = len(stitched["index"])
+
+        stitched["index"].extend(i + index_offset for i in table["index"])
+        for field in POINT_FIELDS:
+            stitched[field].extend(table[field])
+        stitched["seg_dist_m"].append(border_dist)
+        stitched["seg_dist_m"].extend(table["seg_dist_m"][1:])
+        stitched["seg_gain_m"].append(border_gain)
+        stitched["seg_gain_m"].extend(table["seg_gain_m"][1:])
+        stitched["cum_dist_m"].extend(c + dist_offset for c in table["cum_dist_m"])
+        stitched["cum_gain_m"].extend(c + gain_offset for c in table["cum_gain_m"])
+
+        total_distance = stitched["cum_dist_m"][-1]
+        total_gain = stitched["cum_gain_m"][-1]
+        prev = table_last_point(table)
+
+    return stitched, total_distance, total_gain
+
+
+def load_trail_table_parallel(gpx_path, workers=None):
+    # returns the same four things as build_trail_table(), with a columnar table
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or os.path.getsize(gpx_path) < PARALLEL_MIN_BYTES:
+        ranges = split_gpx_ranges(gpx_path, 1)
+        tables = [_table_for_range((gpx_path, s, e)) for s, e in ranges]
+    else:
+        ranges = split_gpx_ranges(gpx_path, workers)
+        jobs = [(gpx_path, s, e) for s, e in ranges]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tables = list(pool.map(_table_for_range, jobs))
+
+    table, total_distance, total_gain = stitch_trail_tables(tables)
+    avg_grade = (total_gain / total_distance) if total_distance > 0 else 0.0
+    return table, total_distance, total_gain, avg_grade
+
+
+# ---------------------------------------------------------------------------
+# Columnar files
+#
+# A trail table saved as a folder with one file per column. Numbers are raw
+# 8-byte values (array.tofile), missing elevations are stored as NaN, and the
+# time column is one line of text per point. Adding rows is just appending
+# bytes to every file, which is what the live mode below needs.
+# ---------------------------------------------------------------------------
+
+COLUMN_TYPECODES = {
+    "index": "q",
+    "lat": "d",
+    "lon": "d",
+    "ele": "d",
+    "seg_dist_m": "d",
+    "cum_dist_m": "d",
+    "seg_gain_m": "d",
+    "cum_gain_m": "d",
+    # split tables from trail_analysis.rollup_by_distance() / rollup_by_time()
+    "split": "q",
+    "start_index": "q",
+    "end_index": "q",
+    "distance_m": "d",
+    "gain_m": "d",
+    "avg_grade": "d",
+    "duration_s": "d",
+    # local projection (see local_xy)
+    "x_m": "d",
+    "y_m": "d"
+}
+
+
+def append_trail_columns(dir_path, table):
+    os.makedirs(dir_path, exist_ok=True)
+    for name in table:
+        values = table[name]
+        typecode = COLUMN_TYPECODES.get(name)
+        if typecode is None:
+            with open(os.path.join(dir_path, name + ".txt"), "a", encoding="utf-8") as f:
+                f.writelines(("" if v is None else v) + "\n" for v in values)
+        else:
+            nan = float("nan")
+            data = array(typecode, (nan if v is None else v for v in values))
+            with open(os.path.join(dir_path, name + ".bin"), "ab") as f:
+                data.tofile(f)
+
+
+def save_trail_columns(dir_path, table):
+    os.makedirs(dir_path, exist_ok=True)
+    for name in os.listdir(dir_path):
+        if name.endswith(".bin") or name.endswith(".txt"):
+            os.remove(os.path.join(dir_path, name))
+    append_trail_columns(dir_path, table)
+
+
+def load_trail_columns(dir_path, names=TRAIL_HEADERS):
+    table = {}
+    for name in names:
+        typecode = COLUMN_TYPECODES.get(name)
+        if typecode is None:
+            path = os.path.join(dir_path, name + ".txt")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    table[name] = [line.rstrip("\n") or None for line in f]
+            continue
+
+        path = os.path.join(dir_path, name + ".bin")
+        if not os.path.exists(path):
+            continue
+        data = array(typecode)
+        with open(path, "rb") as f:
+            data.frombytes(f.read())
+        if name == "ele":
+            table[name] = [None if math.isnan(v) else v for v in data]
+        else:
+            table[name] = data.tolist()
+    return table
+
+
+# ---------------------------------------------------------------------------
+# Live / append mode
+#
+# Trackers upload a GPX that keeps growing during a ride. Instead of rebuilding
+# the whole table every time, a small JSON state file next to the output
+# remembers how far into the GPX we read, the last point, the running totals
+# and how long the output files were. Each update scans only the new bytes and
+# appends only the new rows.
+# ---------------------------------------------------------------------------
+
+def _load_live_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_live_state(state_path, state):
+    with atomic_write(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def _column_file_sizes(dir_path):
+    return {name: os.path.getsize(os.path.join(dir_path, name))
+            for name in os.listdir(dir_path)
+            if name.endswith(".bin") or name.endswith(".txt")}
+
+
+def _truncate_to(path, size):
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+def update_trail_output(gpx_path, out_path, output="csv", state_path=None):
+    # output is "csv" (out_path is a CSV file) or "columns" (out_path is a folder)
+    if output not in ("csv", "columns"):
+        raise ValueError("output must be 'csv' or 'columns', got %r" % (output,))
+    if state_path is None:
+        state_path = out_path.rstrip("/\\") + ".state.json"
+
+    state = _load_live_state(state_path)
+    gpx_size = os.path.getsize(gpx_path)
+    out_exists = os.path.exists(out_path)
+
+    # start over if there is no state, the output is gone, or the GPX shrank
+    # (then it was replaced by a different file, not extended)
+    if state is None or not out_exists or gpx_size < state["gpx_offset"]:
+        state = {
+            "gpx_offset": 0,
+            "next_index": 0,
+            "total_distance": 0.0,
+            "total_gain": 0.0,
+            "last_point": None,
+            "out_bytes": None
+        }
+        if output == "csv":
+            with open(out_path, "w", newline="", encoding="utf-8") as f:
+                csv.DictWriter(f, fieldnames=TRAIL_HEADERS).writeheader()
+        else:
+            save_trail_columns(out_path, {name: [] for name in TRAIL_HEADERS})
+    elif state["out_bytes"] is not None:
+        # a crash after appending rows but before saving the state would
+        # otherwise write those rows twice. out_bytes is the CSV's size, or
+        # {file name: size} for a columnar folder.
+        if output == "csv":
+            _truncate_to(out_path, state["out_bytes"])
+        else:
+            for name, size in state["out_bytes"].items():
+                _truncate_to(os.path.join(out_path, name), size)
+
+    columns = new_columns()
+    new_offset = state["gpx_offset"]
+    if gpx_size > state["gpx_offset"]:
+        with open(gpx_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                columns, new_offset = scan_trkpts(mm, state["gpx_offset"])
+
+    table, total_distance, total_gain = build_trail_columns(
+        columns,
+        prev_point=state["last_point"],
+        total_distance=state["total_distance"],
+        total_gain=state["total_gain"],
+        start_index=state["next_index"]
+    )
+
+    n_new = len(table["lat"])
+    if n_new > 0:
+        if output == "csv":
+            with open(out_path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=TRAIL_HEADERS)
+                for r in table_to_rows(table):
+                    writer.writerow(r)
+        else:
+            append_trail_columns(out_path, table)
+        state["last_point"] = table_last_point(table)
+
+    state["gpx_offset"] = new_offset
+    state["next_index"] += n_new
+    state["total_distance"] = total_distance
+    state["total_gain"] = total_gain
+    if output == "csv":
+        state["out_bytes"] = os.path.getsize(out_path)
+    else:
+        state["out_bytes"] = _column_file_sizes(out_path)
+    _save_live_state(state_path, state)
+
+    return n_new, total_distance, total_gain
+
+
+# ---------------------------------------------------------------------------
+# Batch conversion
+#
+# Converts many GPX files into CSVs in out_dir. With index_path set, every
+# converted file also gets a summary row in the SQLite trail index
+# (trail_index.py), and files that are already indexed and unchanged are
+# skipped, so re-running over a growing library only does the new work.
+#
+# With manifest_path set, the batch keeps a job manifest: a JSON-lines file
+# where every status change (pending / done / failed, plus the CSV's sha256,
+# size and mtime) is appended and fsync'ed. Later lines win when it is read
+# back. A run that gets killed can simply be started again: files marked done
+# whose CSV still matches are skipped, everything else is converted. The CSV
+# is only hashed again when its size or mtime changed, so resuming a batch of
+# thousands of files does not re-read all their outputs. Jobs are keyed by
+# the absolute GPX path, so "a.gpx" and "/data/a.gpx" are the same job. A
+# file that fails is marked failed and the batch moves on to the next one.
+# That includes a truncated GPX file, and a second file whose CSV name is
+# already taken by another job (a/x.gpx and b/x.gpx would both write x.csv).
+# ---------------------------------------------------------------------------
+
+def convert_gpx_file(gpx_path, csv_path):
+    columns = load_gpx_columns(gpx_path, require_complete=True)
+    table, total_distance, total_gain = build_trail_columns(columns)
+    save_trail_csv(csv_path, table_to_rows(table))
+    return table, total_distance, total_gain
+
+
+def output_csv_path(gpx_path, out_dir):
+    name = os.path.splitext(os.path.basename(gpx_path))[0]
+    return os.path.join(out_dir, name + ".csv")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def job_key(gpx_path):
+    return os.path.abspath(gpx_path)
+
+
+def load_job_manifest(manifest_path):
+    # {absolute gpx_path: latest entry}; a torn last line from a crash is ignored
+    jobs = {}
+    if not os.path.exists(manifest_path):
+        return jobs
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            jobs[job_key(entry["gpx_path"])] = entry
+    return jobs
+
+
+def record_job(manifest_file, gpx_path, status, **info):
+    entry = {"gpx_path": job_key(gpx_path), "status": status}
+    entry.update(info)
+    manifest_file.write(json.dumps(entry) + "\n")
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+    return entry
+
+
+def csv_fingerprint(csv_path, sha256=None):
+    # what a "done" entry remembers about its CSV
+    st = os.stat(csv_path)
+    if sha256 is None:
+        sha256 = file_sha256(csv_path)
+    return {"csv_path": csv_path, "sha256": sha256,
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _stat_matches(entry):
+    st = os.stat(entry["csv_path"])
+    return st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns")
+
+
+def _job_is_done(entry):
+    if entry is None or entry["status"] != "done":
+        return False
+    csv_path = entry.get("csv_path")
+    if csv_path is None or not os.path.exists(csv_path):
+        return False
+    if _stat_matches(entry):
+        return True
+    if "size" in entry and os.path.getsize(csv_path) != entry["size"]:
+        return False
+    # touched (or an entry from before sizes were kept): check the content
+    return file_sha256(csv_path) == entry.get("sha256")
+
+
+def convert_gpx_batch(gpx_paths, out_dir, index_path=None, manifest_path=None,
+                      retry_failed=True):
+    os.makedirs(out_dir, exist_ok=True)
+
+    conn = None
+    if index_path is not None:
+        import trail_index
+        conn = trail_index.open_trail_index(index_path)
+
+    jobs = {}
+    manifest_file = None
+    if manifest_path is not None:
+        jobs = load_job_manifest(manifest_path)
+        manifest_file = open(manifest_path, "a", encoding="utf-8")
+
+    converted = []
+    try:
+        # which job each CSV belongs to: jobs already done first, then this
+        # batch in order
+        owners = {}
+        for key, entry in jobs.items():
+            if entry["status"] == "done" and entry.get("csv_path"):
+                owners.setdefault(os.path.abspath(entry["csv_path"]), key)
+
+        # the work queue: everything that is not finished yet
+        todo = []
+        seen = set()
+        for gpx_path in gpx_paths:
+            key = job_key(gpx_path)
+            if key in seen:
+                continue
+            seen.add(key)
+            owners.setdefault(os.path.abspath(output_csv_path(gpx_path, out_dir)), key)
+            entry = jobs.get(key)
+            if _job_is_done(entry):
+                if manifest_file is not None and not _stat_matches(entry):
+                    # same content with a new mtime: note it so the next
+                    # run does not hash the CSV again
+                    record_job(manifest_file, gpx_path, "done",
+                               **csv_fingerprint(entry["csv_path"], entry["sha256"]))
+                continue
+            if entry is not None and entry["status"] == "failed" and not retry_failed:
+                continue
+            todo.append(gpx_path)
+            if manifest_file is not None and (entry is None or entry["status"] != "pending"):
+                record_job(manifest_file, gpx_path, "pending")
+
+        for gpx_path in todo:
+            csv_path = output_csv_path(gpx_path, out_dir)
+            owner = owners[os.path.abspath(csv_path)]
+            if owner != job_key(gpx_path):
+                error = ValueError("%s is already the output of %s" % (csv_path, owner))
+                if manifest_file is None:
+                    raise error
+                record_job(manifest_file, gpx_path, "failed", error=repr(error))
+                continue
+            if conn is not None and os.path.exists(csv_path) and trail_index.is_up_to_date(conn, gpx_path):
+                if manifest_file is not None:
+                    record_job(manifest_file, gpx_path, "done", **csv_fingerprint(csv_path))
+                continue
+
+            try:
+                table, total_distance, total_gain = convert_gpx_file(gpx_path, csv_path)
+                if conn is not None:
+                    summary = trail_index.trail_summary(gpx_path, table, total_distance,
+                                                        total_gain, csv_path)
+                    trail_index.index_trail(conn, summary)
+            except Exception as e:
+                if manifest_file is None:
+                    raise
+                record_job(manifest_file, gpx_path, "failed", error=repr(e))
+                continue
+
+            if manifest_file is not None:
+                record_job(manifest_file, gpx_path, "done", **csv_fingerprint(csv_path))
+            converted.append(csv_path)
+    finally:
+        if manifest_file is not None:
+            manifest_file.close()
+        if conn is not None:
+            conn.close()
+
+    return converted
+
+
+# ---------------------------------------------------------------------------
+# Streaming parser with a recovery mode
+#
+# ET.iterparse() hands us each <trkpt> as soon as its closing tag is read, so
+# the whole tree never has to sit in memory. In strict mode it behaves like
+# load_gpx_points() and raises on broken XML or bad numbers. With
+# recover=True it keeps every complete point read before the file breaks
+# (for example an upload cut off in the middle of a <trkpt>), skips points
+# whose lat/lon are not numbers, drops bad elevations, and writes what
+# happened into the report dictionary instead of raising.
+# ---------------------------------------------------------------------------
+
+def new_parse_report():
+    return {
+        "complete": True,
+        "points": 0,
+        "error_offset": None,
+        "error_line": None,
+        "reason": None,
+        "bad_lat": 0,
+        "bad_lon": 0,
+        "bad_ele": 0,
+        "skipped_points": 0
+    }
+
+
+def _local_name(tag):
+    return tag.rpartition("}")[2]
+
+
+def trkpt_texts(elem):
+    # one finished <trkpt> element (any namespace) -> the raw
+    # (lat, lon, ele, time) texts, any of which can be None
+    ele_text = None
+    time_text = None
+    for child in elem:
+        name = _local_name(child.tag)
+        if name == "ele":
+            ele_text = child.text
+        elif name == "time":
+            time_text = child.text.strip() if child.text else None
+    return elem.get("lat"), elem.get("lon"), ele_text, time_text
+
+
+def trkpt_point(elem):
+    # one finished <trkpt> element (any namespace) -> point dictionary, or
+    # None when it has no lat/lon
+    lat_text, lon_text, ele_text, time_text = trkpt_texts(elem)
+    if lat_text is None or lon_text is None:
+        return None
+
+    return {
+        "lat": float(lat_text),
+        "lon": float(lon_text),
+        "ele": float(ele_text) if ele_text else None,
+        "time": time_text
+    }
+
+
+def _recover_float(text, low=None, high=None):
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    if value != value or value in (math.inf, -math.inf):
+        return None
+    if low is not None and not (low <= value <= high):
+        return None
+    return value
+
+
+def line_col_to_offset(gpx_path, line, column):
+    # expat reports errors as (line, column); turn that into a byte offset
+    offset = 0
+    with open(gpx_path, "rb") as f:
+        for _ in range(line - 1):
+            chunk = f.readline()
+            if not chunk:
+                break
+            offset += len(chunk)
+    return offset + column
+
+
+def iter_gpx_points(gpx_path, recover=False, report=None):
+    if report is None:
+        report = new_parse_report()
+
+    try:
+        for _, elem in ET.iterparse(gpx_path, events=("end",)):
+            if _local_name(elem.tag) != "trkpt":
+                continue
+
+            if not recover:
+                point = trkpt_point(elem)
+                elem.clear()
+                if point is None:
+                    continue
+                report["points"] += 1
+                yield point
+                continue
+
+            lat_text, lon_text, ele_text, time_text = trkpt_texts(elem)
+            elem.clear()
+            if lat_text is None or lon_text is None:
+                continue
+
+            # fast path first: two float() calls and range checks; only a
+            # point that fails them goes through the slower bookkeeping
+            try:
+                lat = float(lat_text)
+                lon = float(lon_text)
+                ok = -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0
+            except ValueError:
+                ok = False
+            if not ok:
+                if _recover_float(lat_text, -90.0, 90.0) is None:
+                    report["bad_lat"] += 1
+                if _recover_float(lon_text, -180.0, 180.0) is None:
+                    report["bad_lon"] += 1
+                report["skipped_points"] += 1
+                continue
+
+            ele = None
+            if ele_text:
+                try:
+                    ele = float(ele_text)
+                except ValueError:
+                    ele = None
+                if ele is None or not math.isfinite(ele):
+                    ele = None
+                    report["bad_ele"] += 1
+
+            report["points"] += 1
+            yield {"lat": lat, "lon": lon, "ele": ele, "time": time_text}
+
+    except ET.ParseError as e:
+        if not recover:
+            raise
+        line, column = e.position
+        report["complete"] = False
+        report["error_line"] = line
+        report["error_offset"] = line_col_to_offset(gpx_path, line, column)
+        report["reason"] = str(e)
+
+
+def load_gpx_points_recover(gpx_path):
+    # returns (points, report), never raises on broken XML or bad numbers
+    report = new_parse_report()
+    points = list(iter_gpx_points(gpx_path, recover=True, report=report))
+    return points, report
+
+
+# ---------------------------------------------------------------------------
+# Writing GPX: the way back from a trail table
+#
+# Reads a CSV in the save_trail_csv() layout (or a columnar folder) a chunk of
+# points at a time and writes GPX 1.1 in the Topografix namespace, the same
+# one load_gpx_points() detects. Each chunk becomes one big string and one
+# write() call, so memory stays bounded by the chunk size and not the track.
+# Numbers are written with repr(), which float() reads back exactly.
+# ---------------------------------------------------------------------------
+
+GPX_NAMESPACE = "http://www.topografix.com/GPX/1/1"
+GPX_CHUNK_POINTS = 10000
+
+
+def _optional_float(text):
+    return float(text) if text else None
+
+
+def iter_csv_point_chunks(csv_path, chunk_size=GPX_CHUNK_POINTS):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        lat_i = header.index("lat")
+        lon_i = header.index("lon")
+        ele_i = header.index("ele") if "ele" in header else None
+        time_i = header.index("time") if "time" in header else None
+
+        columns = new_columns()
+        for row in reader:
+            if not row:
+                continue
+            columns["lat"].append(float(row[lat_i]))
+            columns["lon"].append(float(row[lon_i]))
+            columns["ele"].append(_optional_float(row[ele_i]) if ele_i is not None else None)
+            columns["time"].append((row[time_i] or None) if time_i is not None else None)
+            if len(columns["lat"]) >= chunk_size:
+                yield columns
+                columns = new_columns()
+        if columns["lat"]:
+            yield columns
+
+
+def iter_columns_point_chunks(dir_path, chunk_size=GPX_CHUNK_POINTS):
+    # same as iter_csv_point_chunks() for a save_trail_columns() folder
+    files = {}
+    time_file = None
+    try:
+        for name in ("lat", "lon", "ele"):
+            files[name] = open(os.path.join(dir_path, name + ".bin"), "rb")
+        time_path = os.path.join(dir_path, "time.txt")
+        time_file = open(time_path, encoding="utf-8") if os.path.exists(time_path) else None
+
+        while True:
+            columns = new_columns()
+            for name in ("lat", "lon", "ele"):
+                data = array("d")
+                data.frombytes(files[name].read(chunk_size * data.itemsize))
+                columns[name] = data.tolist()
+            n = len(columns["lat"])
+            if n == 0:
+                break
+            columns["ele"] = [None if math.isnan(v) else v for v in columns["ele"]]
+            if time_file is not None:
+                columns["time"] = [(time_file.readline().rstrip("\n") or None) for _ in range(n)]
+            else:
+                columns["time"] = [None] * n
+            yield columns
+    finally:
+        for f in files.values():
+            f.close()
+        if time_file is not None:
+            time_file.close()
+
+
+def write_gpx(gpx_path, point_chunks, name=None, creator="gpx_pipeline"):
+    from xml.sax.saxutils import escape, quoteattr
+
+    with atomic_write(gpx_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<gpx version="1.1" creator=%s xmlns="%s">\n' % (quoteattr(creator), GPX_NAMESPACE))
+        f.write("<trk>\n")
+        if name:
+            f.write("<name>%s</name>\n" % escape(name))
+        f.write("<trkseg>\n")
+
+        for columns in point_chunks:
+            parts = []
+            for lat, lon, ele, time_text in zip(columns["lat"], columns["lon"],
+                                                columns["ele"], columns["time"]):
+                parts.append('<trkpt lat="%r" lon="%r">' % (lat, lon))
+                if ele is not None:
+                    parts.append("<ele>%r</ele>" % ele)
+                if time_text:
+                    parts.append("<time>%s</time>" % escape(time_text))
+                parts.append("</trkpt>\n")
+            f.write("".join(parts))
+
+        f.write("</trkseg>\n</trk>\n</gpx>\n")
+
+
+def csv_to_gpx(csv_path, gpx_path, name=None, chunk_size=GPX_CHUNK_POINTS):
+    write_gpx(gpx_path, iter_csv_point_chunks(csv_path, chunk_size), name)
+
+
+def trail_columns_to_gpx(dir_path, gpx_path, name=None, chunk_size=GPX_CHUNK_POINTS):
+    write_gpx(gpx_path, iter_columns_point_chunks(dir_path, chunk_size), name)
+
+
+# ---------------------------------------------------------------------------
+# Shared-memory columns
+#
+# Sending the points list to worker processes pickles every dictionary, and
+# for simple passes that copy costs more than the work itself. Instead the
+# parent copies lat/lon/ele (and the time as seconds) once into a
+# multiprocessing.shared_memory block, and workers attach to it by name and
+# read the numbers in place through memoryviews, without copying anything.
+#
+#     with shared_columns(columns) as descriptor:      # parent
+#         pool.map(work, [descriptor] * n)
+#
+#     def work(descriptor):                             # worker
+#         with attached_columns(descriptor) as cols:
+#             ... cols["lat"][i] ...
+#
+# Missing elevations / times are NaN in shared memory. The parent owns the
+# block: shared_columns() unlinks it when the with-block ends, workers only
+# close their own mapping.
+# ---------------------------------------------------------------------------
+
+SHARED_FIELDS = ["lat", "lon", "ele", "t"]
+
+
+def publish_columns(columns):
+    # returns (shm, descriptor); the caller must shm.close() and shm.unlink()
+    from multiprocessing import shared_memory
+    from trail_analysis import parse_gpx_time
+
+    n = len(columns["lat"])
+    nan = float("nan")
+    itemsize = array("d").itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(itemsize, n * itemsize * len(SHARED_FIELDS)))
+    try:
+        buf = shm.buf.cast("d")
+        for k, field in enumerate(SHARED_FIELDS):
+            if field == "t":
+                values = (parse_gpx_time(t) for t in columns["time"])
+            else:
+                values = columns[field]
+            buf[k * n:(k + 1) * n] = array("d", (nan if v is None else v for v in values))
+        buf.release()
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+    descriptor = {"name": shm.name, "n": n, "fields": list(SHARED_FIELDS)}
+    return shm, descriptor
+
+
+@contextmanager
+def shared_columns(columns):
+    shm, descriptor = publish_columns(columns)
+    try:
+        yield descriptor
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+_attach_lock = threading.Lock()
+
+
+def _attach_shared_memory(name):
+    # Attach without telling the resource tracker: only the block's creator
+    # is registered, so only its tracker unlinks the block (also when the
+    # creator crashes). Python 3.13 has track=False for this. Older versions
+    # register every attach, and unregistering afterwards is no fix: pool
+    # workers share the creator's tracker, so that would drop the creator's
+    # own registration. So for the duration of the attach, register() is
+    # swapped for a no-op.
+    from multiprocessing import resource_tracker, shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+@contextmanager
+def attached_columns(descriptor):
+    # yields {"lat": memoryview, ...}; the views are only valid inside the block
+    shm = _attach_shared_memory(descriptor["name"])
+    n = descriptor["n"]
+    buf = shm.buf.cast("d")
+    views = {field: buf[k * n:(k + 1) * n] for k, field in enumerate(descriptor["fields"])}
+    try:
+        yield views
+    finally:
+        # every view has to be released before the mapping can be closed
+        for view in views.values():
+            view.release()
+        buf.release()
+        shm.close()
+
+
+def shared_trail_stats(descriptor):
+    # compute_trail_stats() for a worker attached to shared columns
+    with attached_columns(descriptor) as cols:
+        _, _, _, _, total_distance, total_gain = trail_kernel(
+            cols["lat"], cols["lon"], cols["ele"], want_table=False)
+    avg_grade = (total_gain / total_distance) if total_distance > 0 else 0.0
+    return total_distance, total_gain, avg_grade
+
+
+# ---------------------------------------------------------------------------
+# Choosing the output columns
+#
+# convert_gpx(..., columns=["lat", "lon", "cum_dist_m"]) writes only those
+# columns, and only does the work they need: the plan walks backwards from
+# the requested columns through what each one depends on, so here the time
+# and elevation are never read from the file and no gain is computed.
+#
+# Every column is an entry in TRAIL_COLUMNS: (columns it depends on,
+# function(table) -> list of values). "lat", "lon", "ele" and "time" come
+# straight from the reader. Extra columns can be plugged in, for example
+#     register_column("cum_dist_km", ["cum_dist_m"],
+#                     lambda t: [d / 1000 for d in t["cum_dist_m"]])
+# ---------------------------------------------------------------------------
+
+def _index_column(table):
+    return list(range(len(table["lat"])))
+
+
+def _kernel_column(name):
+    # The distance and gain columns all come out of one trail_kernel() pass.
+    # Whichever of them is computed first runs it for every kernel column in
+    # the plan (build_projected_table() notes them as "_kernel_outputs") and
+    # leaves the results in the table for the others. Columns nobody asked
+    # for are not built, and their half of the math is skipped.
+    def compute(table):
+        if "_kernel" not in table:
+            outputs = table.get("_kernel_outputs") or [name]
+            seg_dists, cum_dists, seg_gains, cum_gains, _, _ = trail_kernel(
+                table.get("lat"), table.get("lon"), table.get("ele"), outputs=outputs)
+            table["_kernel"] = {"seg_dist_m": seg_dists, "cum_dist_m": cum_dists,
+                                "seg_gain_m": seg_gains, "cum_gain_m": cum_gains}
+        return table["_kernel"][name]
+    return compute
+
+
+def _elapsed_column(table):
+    from trail_analysis import parse_gpx_time
+
+    seconds = [parse_gpx_time(t) for t in table["time"]]
+    start = next((s for s in seconds if s is not None), None)
+    return [None if s is None else s - start for s in seconds]
+
+
+SOURCE_COLUMNS = ["lat", "lon", "ele", "time"]
+
+TRAIL_COLUMNS = {
+    "index": ([], _index_column),
+    "seg_dist_m": (["lat", "lon"], _kernel_column("seg_dist_m")),
+    "cum_dist_m": (["lat", "lon"], _kernel_column("cum_dist_m")),
+    "seg_gain_m": (["ele"], _kernel_column("seg_gain_m")),
+    "cum_gain_m": (["ele"], _kernel_column("cum_gain_m")),
+    "elapsed_s": (["time"], _elapsed_column)
+}
+
+
+def register_column(name, depends_on, compute):
+    if name in SOURCE_COLUMNS:
+        raise ValueError("%r is read from the GPX file and cannot be replaced" % (name,))
+    TRAIL_COLUMNS[name] = (list(depends_on), compute)
+
+
+def plan_columns(wanted):
+    # returns (source fields to read, derived columns in the order to compute them)
+    sources = []
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in sources or name in order:
+            return
+        if name in SOURCE_COLUMNS:
+            sources.append(name)
+            return
+        if name not in TRAIL_COLUMNS:
+            raise ValueError("unknown column %r" % (name,))
+        if name in visiting:
+            raise ValueError("column %r depends on itself" % (name,))
+        visiting.add(name)
+        for dep in TRAIL_COLUMNS[name][0]:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in wanted:
+        visit(name)
+    return sources, order
+
+
+def build_projected_table(columns, wanted):
+    # columns from a reader -> table holding exactly the wanted columns
+    _, order = plan_columns(wanted)
+    table = dict(columns)
+    table["_kernel_outputs"] = [name for name in order if name in KERNEL_OUTPUTS]
+    for name in order:
+        table[name] = TRAIL_COLUMNS[name][1](table)
+    return {name: table[name] for name in wanted}
+
+
+def convert_gpx(gpx_path, csv_path, columns=None):
+    # like convert_gpx_file(), but writes (and computes) only the chosen columns
+    if columns is None:
+        columns = TRAIL_HEADERS
+    sources, _ = plan_columns(columns)
+    points = load_gpx_columns(gpx_path, fields=sources)
+    table = build_projected_table(points, columns)
+    save_trail_csv(csv_path, table_to_rows(table), headers=list(columns))
+    return table
+
+
+# ---------------------------------------------------------------------------
+# Local projection
+#
+# Most geometry on one track (distances, simplification, grid lookups,
+# matching) does not need the sphere: over a few tens of km the Earth is flat
+# enough. local_xy() projects lat/lon onto a plane touching the Earth at the
+# track's first point (an equirectangular "local tangent plane"):
+#     x = R * cos(lat0) * (lon - lon0)      y = R * (lat - lat0)
+# in meters, so a distance is just sqrt(dx*dx + dy*dy). ensure_local_xy()
+# stores the result as x_m / y_m columns in the table, so it is computed once
+# and then reused by every later step (and saved by save_trail_columns()).
+#
+# How wrong is it? North-south distances are exact. East-west distances are
+# scaled by cos(lat0) / cos(lat), so the relative error grows with how far the
+# track strays north or south of its first point: about tan(lat0) * dlat
+# (dlat in radians). projection_error_bound() works it out for a track:
+# for a trail 10 km north-south at 45 degrees it is about 0.16%, for a
+# 1 km city loop about 0.016%. Segment-by-segment the plane adds nothing
+# measurable beyond that (segments are meters long, so the curvature term
+# (d / R)**2 is below 1e-10).
+# ---------------------------------------------------------------------------
+
+def local_xy(lats, lons, lat0=None, lon0=None):
+    if len(lats) == 0:
+        return [], []
+    if lat0 is None:
+        lat0, lon0 = lats[0], lons[0]
+
+    to_rad = math.pi / 180.0
+    kx = R * math.cos(lat0 * to_rad) * to_rad
+    ky = R * to_rad
+    xs = []
+    for lon in lons:
+        dlon = lon - lon0
+        # a track crossing the 180th meridian should not jump across the planet
+        if dlon > 180.0:
+            dlon -= 360.0
+        elif dlon < -180.0:
+            dlon += 360.0
+        xs.append(kx * dlon)
+    ys = [ky * (lat - lat0) for lat in lats]
+    return xs, ys
+
+
+def ensure_local_xy(table):
+    # the cached x_m / y_m columns of table, computed on first use
+    if "x_m" not in table or len(table["x_m"]) != len(table["lat"]):
+        table["x_m"], table["y_m"] = local_xy(table["lat"], table["lon"])
+    return table["x_m"], table["y_m"]
+
+
+def projection_error_bound(table):
+    # largest relative error of a local_xy() distance compared to haversine
+    # anywhere on this track (0.001 means 0.1%)
+    lats = table["lat"]
+    if len(lats) == 0:
+        return 0.0
+    # cos(lat) peaks at the equator, so the worst scale is at one of the two
+    # ends of the latitude range, or at lat 0 when the track crosses it
+    lat_min = min(lats)
+    lat_max = max(lats)
+    checked = [lat_min, lat_max]
+    if lat_min <= 0.0 <= lat_max:
+        checked.append(0.0)
+    cos0 = math.cos(math.radians(lats[0]))
+    scale_error = max(abs(cos0 / math.cos(math.radians(lat)) - 1.0)
+                      for lat in checked)
+    return scale_error
+
+
+def planar_seg_dists(table):
+    # seg_dist_m from the cached projection instead of haversine
+    xs, ys = ensure_local_xy(table)
+    seg_dists = [0.0] * len(xs)
+    for i in range(1, len(xs)):
+        dx = xs[i] - xs[i - 1]
+        dy = ys[i] - ys[i - 1]
+        seg_dists[i] = math.sqrt(dx * dx + dy * dy)
+    return seg_dists
+
+
+def simplify_track(table, tolerance_m=5.0):
+    # Douglas-Peucker on the projected points: the indices of the points to
+    # keep so that no dropped point is more than tolerance_m from the
+    # simplified track
+    xs, ys = ensure_local_xy(table)
+    n = len(xs)
+    if n < 3:
+        return list(range(n))
+
+    keep = [False] * n
+    keep[0] = keep[n - 1] = True
+    stack = [(0, n - 1)]
+    tol2 = tolerance_m * tolerance_m
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = xs[first], ys[first]
+        dx = xs[last] - x1
+        dy = ys[last] - y1
+        length2 = dx * dx + dy * dy
+
+        worst = -1.0
+        worst_i = None
+        for i in range(first + 1, last):
+            px = xs[i] - x1
+            py = ys[i] - y1
+            if length2 > 0:
+                # squared distance from the point to the segment first-last
+                # (not the infinite line: on an out-and-back the ends nearly
+                # meet and the whole trail can lie on that line)
+                u = (px * dx + py * dy) / length2
+                if u < 0.0:
+                    u = 0.0
+                elif u > 1.0:
+                    u = 1.0
+                ex = px - u * dx
+                ey = py - u * dy
+                d2 = ex * ex + ey * ey
+            else:
+                d2 = px * px + py * py
+            if d2 > worst:
+                worst = d2
+                worst_i = i
+
+        if worst_i is not None and worst > tol2:
+            keep[worst_i] = True
+            stack.append((first, worst_i))
+            stack.append((worst_i, last))
+
+    return [i for i in range(n) if keep[i]]
+
+
+register_column("x_m", ["lat", "lon"], lambda t: ensure_local_xy(t)[0])
+register_column("y_m", ["lat", "lon"], lambda t: ensure_local_xy(t)[1])
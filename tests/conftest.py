@@ -0,0 +1,15 @@
+# The modules live at the top of the repository, next to "Project code.py",
+# so make them importable when pytest is run from anywhere.
+
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_GPX = os.path.join(REPO_DIR, "001-multiuse-all-uses (1).gpx")
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "perf: speed and memory budgets (slow)")
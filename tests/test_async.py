@@ -0,0 +1,44 @@
+# the asyncio front end against the synchronous pipeline
+
+import asyncio
+import csv
+from pathlib import Path
+
+import gpx_async
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+
+class _Upload:
+    # stands in for asyncio.StreamReader: hands out the bytes in small reads
+    def __init__(self, data):
+        self.data = data
+
+    async def read(self, n):
+        chunk, self.data = self.data[:n], self.data[n:]
+        return chunk
+
+
+async def _collect(stream, **kwargs):
+    return [point async for point in gpx_async.aload_gpx_points(stream, **kwargs)]
+
+
+def test_paths_and_streams_give_the_same_points():
+    expected = gpx_pipeline.load_gpx_points(SAMPLE_GPX)
+    with open(SAMPLE_GPX, "rb") as f:
+        data = f.read()
+
+    assert asyncio.run(_collect(SAMPLE_GPX)) == expected
+    assert asyncio.run(_collect(Path(SAMPLE_GPX))) == expected
+    assert asyncio.run(_collect(_Upload(data), chunk_size=1000)) == expected
+
+
+def test_aconvert_takes_path_objects(tmp_path):
+    dst = tmp_path / "sample.csv"
+    stats = asyncio.run(gpx_async.aconvert(Path(SAMPLE_GPX), dst))
+
+    rows, total_distance, total_gain, avg_grade = gpx_pipeline.build_trail_table(
+        gpx_pipeline.load_gpx_points(SAMPLE_GPX))
+    assert stats == (total_distance, total_gain, avg_grade)
+    with open(dst, newline="") as f:
+        assert len(list(csv.DictReader(f))) == len(rows)
@@ -0,0 +1,51 @@
+# batch conversion with a job manifest
+
+import shutil
+
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+
+def _statuses(manifest_path):
+    return {key: entry["status"] for key, entry in gpx_pipeline.load_job_manifest(manifest_path).items()}
+
+
+def test_resumed_batch_skips_finished_files(tmp_path):
+    gpx_path = str(tmp_path / "trail.gpx")
+    shutil.copy(SAMPLE_GPX, gpx_path)
+    manifest = str(tmp_path / "jobs.jsonl")
+    out_dir = str(tmp_path / "out")
+
+    assert len(gpx_pipeline.convert_gpx_batch([gpx_path], out_dir, manifest_path=manifest)) == 1
+    assert gpx_pipeline.convert_gpx_batch([gpx_path], out_dir, manifest_path=manifest) == []
+
+
+def test_same_file_name_in_two_folders_is_not_overwritten(tmp_path):
+    for folder in ("a", "b"):
+        (tmp_path / folder).mkdir()
+        shutil.copy(SAMPLE_GPX, str(tmp_path / folder / "x.gpx"))
+    paths = [str(tmp_path / "a" / "x.gpx"), str(tmp_path / "b" / "x.gpx")]
+    manifest = str(tmp_path / "jobs.jsonl")
+    out_dir = str(tmp_path / "out")
+
+    gpx_pipeline.convert_gpx_batch(paths, out_dir, manifest_path=manifest)
+    # the batch settles: the first file stays done, the second keeps failing
+    assert gpx_pipeline.convert_gpx_batch(paths, out_dir, manifest_path=manifest) == []
+    assert _statuses(manifest) == {paths[0]: "done", paths[1]: "failed"}
+
+
+def test_truncated_files_are_marked_failed(tmp_path):
+    with open(SAMPLE_GPX, "rb") as f:
+        data = f.read()
+    cut = tmp_path / "cut.gpx"
+    cut.write_bytes(data[:len(data) // 2])
+    bare = tmp_path / "bare.gpx"
+    bare.write_bytes(b"<gpx><trk><trkpt lat='1'")
+    manifest = str(tmp_path / "jobs.jsonl")
+    out_dir = tmp_path / "out"
+
+    converted = gpx_pipeline.convert_gpx_batch([str(cut), str(bare)], str(out_dir), manifest_path=manifest)
+
+    assert converted == []
+    assert set(_statuses(manifest).values()) == {"failed"}
+    assert not (out_dir / "cut.csv").exists()
@@ -0,0 +1,44 @@
+# choosing the output columns of convert_gpx()
+
+import pytest
+
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+
+@pytest.fixture(scope="module")
+def full_table():
+    table, _, _ = gpx_pipeline.build_trail_columns(gpx_pipeline.load_gpx_columns(SAMPLE_GPX))
+    return table
+
+
+@pytest.mark.parametrize("columns", [
+    gpx_pipeline.TRAIL_HEADERS,
+    ["lat", "lon", "cum_dist_m"],
+    ["cum_gain_m"],
+    ["seg_dist_m", "seg_gain_m"],
+])
+def test_projection_matches_the_full_table(columns, full_table, tmp_path):
+    table = gpx_pipeline.convert_gpx(SAMPLE_GPX, str(tmp_path / "out.csv"), columns)
+    assert list(table) == list(columns)
+    for name in columns:
+        assert table[name] == full_table[name]
+
+
+def test_distance_only_plan_skips_elevation():
+    sources, order = gpx_pipeline.plan_columns(["lat", "lon", "cum_dist_m"])
+    assert sources == ["lat", "lon"]
+    assert order == ["cum_dist_m"]
+
+
+def test_kernel_builds_only_the_requested_lists(full_table):
+    seg_dists, cum_dists, seg_gains, cum_gains, total_distance, total_gain = gpx_pipeline.trail_kernel(
+        full_table["lat"], full_table["lon"], None, outputs=["cum_dist_m"])
+    assert seg_dists == seg_gains == cum_gains == []
+    assert cum_dists == full_table["cum_dist_m"]
+    assert total_gain == 0.0
+
+    _, _, _, cum_gains, total_distance, _ = gpx_pipeline.trail_kernel(
+        None, None, full_table["ele"], outputs=["cum_gain_m"])
+    assert cum_gains == full_table["cum_gain_m"]
+    assert total_distance == 0.0
@@ -0,0 +1,66 @@
+# parse -> write -> parse has to give back the same points, through both
+# writers and across chunk borders
+
+import pytest
+
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+CHUNK_SIZE = 7   # small and odd, so chunk borders fall all over the track
+
+
+def _track_with_gaps(tmp_path):
+    # the sample has ele and time on every point; this one also has points
+    # without them, and a time that needs escaping
+    points = gpx_pipeline.load_gpx_points(SAMPLE_GPX)[:30]
+    points[3]["ele"] = None
+    points[4]["time"] = None
+    points[5]["ele"] = None
+    points[5]["time"] = None
+    points[6]["time"] = "2025-11-12T10:00:00Z <& local>"
+    gpx_path = str(tmp_path / "gaps.gpx")
+    gpx_pipeline.write_gpx(gpx_path, [gpx_pipeline.points_to_columns(points)])
+    return gpx_path
+
+
+@pytest.fixture(params=["sample", "gaps"])
+def gpx_path(request, tmp_path):
+    if request.param == "sample":
+        return SAMPLE_GPX
+    return _track_with_gaps(tmp_path)
+
+
+def test_csv_round_trip(gpx_path, tmp_path):
+    points = gpx_pipeline.load_gpx_points(gpx_path)
+    rows, _, _, _ = gpx_pipeline.build_trail_table(points)
+    csv_path = str(tmp_path / "trail.csv")
+    out_path = str(tmp_path / "back.gpx")
+
+    gpx_pipeline.save_trail_csv(csv_path, rows)
+    gpx_pipeline.csv_to_gpx(csv_path, out_path, chunk_size=CHUNK_SIZE)
+
+    assert gpx_pipeline.load_gpx_points(out_path) == points
+
+
+def test_columns_round_trip(gpx_path, tmp_path):
+    points = gpx_pipeline.load_gpx_points(gpx_path)
+    table, _, _ = gpx_pipeline.build_trail_columns(gpx_pipeline.points_to_columns(points))
+    dir_path = str(tmp_path / "trail")
+    out_path = str(tmp_path / "back.gpx")
+
+    gpx_pipeline.save_trail_columns(dir_path, table)
+    gpx_pipeline.trail_columns_to_gpx(dir_path, out_path, chunk_size=CHUNK_SIZE)
+
+    assert gpx_pipeline.load_gpx_points(out_path) == points
+
+
+def test_round_trip_keeps_name(tmp_path):
+    csv_path = str(tmp_path / "trail.csv")
+    out_path = str(tmp_path / "back.gpx")
+    rows, _, _, _ = gpx_pipeline.build_trail_table(gpx_pipeline.load_gpx_points(SAMPLE_GPX))
+    gpx_pipeline.save_trail_csv(csv_path, rows)
+
+    gpx_pipeline.csv_to_gpx(csv_path, out_path, name="Lynnville & back", chunk_size=CHUNK_SIZE)
+
+    with open(out_path, encoding="utf-8") as f:
+        assert "<name>Lynnville &amp; back</name>" in f.read()
@@ -0,0 +1,84 @@
+# live mode: a GPX file that keeps growing, converted a piece at a time
+
+import pytest
+
+import gpx_pipeline
+from benchmarks import synthetic_points
+
+N_POINTS = 3000
+
+
+@pytest.fixture(scope="module")
+def track(tmp_path_factory):
+    # (GPX bytes, table of the whole file)
+    dir_path = tmp_path_factory.mktemp("live")
+    gpx_path = str(dir_path / "full.gpx")
+    gpx_pipeline.write_gpx(gpx_path, [gpx_pipeline.points_to_columns(synthetic_points(N_POINTS))])
+    with open(gpx_path, "rb") as f:
+        data = f.read()
+    csv_path = str(dir_path / "full.csv")
+    table, _, _ = gpx_pipeline.convert_gpx_file(gpx_path, csv_path)
+    return data, table, csv_path
+
+
+def _cuts(data):
+    # byte offsets that land in the middle of a <trkpt>, of a number and of
+    # a tag, then the whole file
+    trkpt = data.index(b"<trkpt", len(data) // 5)
+    return [trkpt + 3, trkpt + 20, data.index(b"<ele>", len(data) // 2) + 2,
+            data.index(b"</trkpt>", 3 * len(data) // 4) + 4, len(data)]
+
+
+def _grow(gpx_path, data, out_path, output, update=None):
+    update = update or gpx_pipeline.update_trail_output
+    for cut in _cuts(data):
+        with open(gpx_path, "wb") as f:
+            f.write(data[:cut])
+        update(gpx_path, out_path, output=output)
+
+
+def test_growing_file_matches_one_conversion_csv(track, tmp_path):
+    data, _, full_csv = track
+    out_path = str(tmp_path / "live.csv")
+    _grow(str(tmp_path / "live.gpx"), data, out_path, "csv")
+    with open(out_path, "rb") as live, open(full_csv, "rb") as full:
+        assert live.read() == full.read()
+
+
+def test_growing_file_matches_one_conversion_columns(track, tmp_path):
+    data, table, _ = track
+    out_path = str(tmp_path / "live")
+    _grow(str(tmp_path / "live.gpx"), data, out_path, "columns")
+    assert gpx_pipeline.load_trail_columns(out_path) == table
+
+
+@pytest.mark.parametrize("output", ["csv", "columns"])
+def test_crash_before_saving_state_does_not_duplicate_rows(track, tmp_path, monkeypatch, output):
+    data, table, full_csv = track
+    gpx_path = str(tmp_path / "live.gpx")
+    out_path = str(tmp_path / ("live.csv" if output == "csv" else "live"))
+    save_state = gpx_pipeline._save_live_state
+    calls = []
+
+    def crash_on_third_update(state_path, state):
+        # the rows of the third update (about half the track) are appended,
+        # then the process dies
+        calls.append(state_path)
+        if len(calls) == 3:
+            raise KeyboardInterrupt("killed")
+        save_state(state_path, state)
+
+    def update(*args, **kwargs):
+        try:
+            gpx_pipeline.update_trail_output(*args, **kwargs)
+        except KeyboardInterrupt:
+            pass
+
+    monkeypatch.setattr(gpx_pipeline, "_save_live_state", crash_on_third_update)
+    _grow(gpx_path, data, out_path, output, update)
+
+    if output == "csv":
+        with open(out_path, "rb") as live, open(full_csv, "rb") as full:
+            assert live.read() == full.read()
+    else:
+        assert gpx_pipeline.load_trail_columns(out_path) == table
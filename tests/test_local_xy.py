@@ -0,0 +1,77 @@
+# the local tangent-plane projection and what is built on it
+
+import math
+
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+
+def _table(points):
+    table, _, _ = gpx_pipeline.build_trail_columns(gpx_pipeline.points_to_columns(points))
+    return table
+
+
+def _out_and_back(n=101, length_m=1950.0):
+    # straight out north and back down the same line, stopping 0.08 m short
+    # of the start, so the start and end are nearly the same point
+    lat0, lon0 = 45.0, 7.0
+    deg_per_m = 1.0 / (gpx_pipeline.R * math.pi / 180.0)
+    out = [length_m * i / (n - 1) for i in range(n)]
+    back = [0.08 + (length_m - 0.08) * i / (n - 1) for i in range(n - 2, -1, -1)]
+    return _table([{"lat": lat0 + deg_per_m * y, "lon": lon0, "ele": None, "time": None}
+                   for y in out + back])
+
+
+def _max_dropped_offset(table, kept):
+    # largest distance from a dropped point to the kept polyline, in meters
+    xs, ys = gpx_pipeline.ensure_local_xy(table)
+    worst = 0.0
+    for a, b in zip(kept, kept[1:]):
+        dx = xs[b] - xs[a]
+        dy = ys[b] - ys[a]
+        length2 = dx * dx + dy * dy
+        for i in range(a + 1, b):
+            px = xs[i] - xs[a]
+            py = ys[i] - ys[a]
+            u = min(max((px * dx + py * dy) / length2, 0.0), 1.0) if length2 else 0.0
+            worst = max(worst, math.hypot(px - u * dx, py - u * dy))
+    return worst
+
+
+def test_planar_distances_stay_within_the_bound():
+    table = _table(gpx_pipeline.load_gpx_points(SAMPLE_GPX))
+    planar = sum(gpx_pipeline.planar_seg_dists(table))
+    exact = table["cum_dist_m"][-1]
+    assert abs(planar - exact) / exact <= gpx_pipeline.projection_error_bound(table) + 1e-6
+
+
+
+def test_bound_covers_a_track_across_the_equator():
+    # starts at 10N, runs south to 10S with one step east on the equator,
+    # where the projection (scaled for 10N) is furthest off
+    points = [{"lat": 10.0 - i, "lon": 7.0, "ele": None, "time": None} for i in range(11)]
+    points.append({"lat": 0.0, "lon": 7.01, "ele": None, "time": None})
+    points += [{"lat": -i, "lon": 7.01, "ele": None, "time": None} for i in range(1, 11)]
+    table = _table(points)
+
+    bound = gpx_pipeline.projection_error_bound(table)
+    assert math.isclose(bound, 1.0 - math.cos(math.radians(10.0)), rel_tol=1e-9)
+    east = 11
+    planar = gpx_pipeline.planar_seg_dists(table)[east]
+    exact = table["seg_dist_m"][east]
+    assert 0.01 < abs(planar - exact) / exact <= bound + 1e-6
+
+def test_simplify_keeps_the_turnaround_of_an_out_and_back():
+    table = _out_and_back()
+    kept = gpx_pipeline.simplify_track(table, tolerance_m=5.0)
+    turnaround = len(table["lat"]) // 2
+    assert kept == [0, turnaround, len(table["lat"]) - 1]
+    assert _max_dropped_offset(table, kept) <= 5.0
+
+
+def test_simplify_sample_within_tolerance():
+    table = _table(gpx_pipeline.load_gpx_points(SAMPLE_GPX))
+    kept = gpx_pipeline.simplify_track(table, tolerance_m=5.0)
+    assert kept[0] == 0 and kept[-1] == len(table["lat"]) - 1
+    assert len(kept) < len(table["lat"])
+    assert _max_dropped_offset(table, kept) <= 5.0
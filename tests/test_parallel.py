@@ -0,0 +1,30 @@
+# parallel parsing: ranges cut at <trkpt and stitched back together
+
+import pytest
+
+import gpx_pipeline
+from benchmarks import synthetic_points
+
+
+@pytest.fixture(scope="module")
+def gpx_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("parallel") / "track.gpx")
+    gpx_pipeline.write_gpx(path, [gpx_pipeline.points_to_columns(synthetic_points(5000))])
+    return path
+
+
+@pytest.mark.parametrize("workers", [2, 3, 7])
+def test_stitched_table_matches_one_pass(gpx_path, workers, monkeypatch):
+    monkeypatch.setattr(gpx_pipeline, "PARALLEL_MIN_BYTES", 0)
+    assert len(gpx_pipeline.split_gpx_ranges(gpx_path, workers)) == workers
+
+    table, total_distance, total_gain, _ = gpx_pipeline.load_trail_table_parallel(gpx_path, workers)
+    expected, expected_distance, expected_gain = gpx_pipeline.build_trail_columns(
+        gpx_pipeline.load_gpx_columns(gpx_path))
+
+    for name in ("index", "lat", "lon", "ele", "time"):
+        assert table[name] == expected[name]
+    for name in ("seg_dist_m", "cum_dist_m", "seg_gain_m", "cum_gain_m"):
+        assert table[name] == pytest.approx(expected[name], rel=1e-9, abs=1e-9)
+    assert total_distance == pytest.approx(expected_distance, rel=1e-9)
+    assert total_gain == pytest.approx(expected_gain, rel=1e-9)
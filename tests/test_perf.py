@@ -0,0 +1,124 @@
+# Speed and memory budgets for the conversion pipeline (GPX -> trail table ->
+# CSV) on generated tracks. They fail when
+#  - the peak memory per point goes over MAX_BYTES_PER_POINT,
+#  - the throughput drops below MIN_POINTS_PER_CALIBRATION_OP times a fixed
+#    calibration loop, so a slower machine does not fail them by itself,
+#  - the time grows faster than linear in the number of points (fitted
+#    exponent above MAX_SCALING_EXPONENT), which catches quadratic patterns
+#    like list.insert(0, ...) or re-parsing the file inside a loop,
+#  - "Project code.py" goes back to loading the GPX file more times than needed.
+# They take about half a minute; skip them with  python -m pytest -m "not perf".
+#
+# The sizes span 32x, and the time of a 10-point file (opening, headers, the
+# CSV rename) is taken off every measurement before fitting, so fixed costs
+# do not flatten the curve and hide a mildly super-linear regression.
+
+import math
+import os
+import re
+import tracemalloc
+
+import pytest
+
+import gpx_pipeline
+from benchmarks import best_of, synthetic_points
+from conftest import REPO_DIR
+
+pytestmark = pytest.mark.perf
+
+SIZES = [10000, 20000, 40000, 80000, 160000, 320000]
+MEMORY_SIZE = 40000
+
+MAX_BYTES_PER_POINT = 1200
+MIN_POINTS_PER_CALIBRATION_OP = 0.0015
+MAX_SCALING_EXPONENT = 1.25
+MAX_SCRIPT_GPX_LOADS = 2   # Part 1 and the final Part 4 showcase
+
+
+def calibration_ops_per_sec(n=1000000):
+    # a plain Python loop with float math: how fast this machine runs Python
+    def loop():
+        total = 0.0
+        sin = math.sin
+        for i in range(n):
+            total += sin(i)
+        return total
+
+    return n / best_of(loop)
+
+
+def run_pipeline(gpx_path, csv_path):
+    columns = gpx_pipeline.load_gpx_columns(gpx_path)
+    table, _, _ = gpx_pipeline.build_trail_columns(columns)
+    gpx_pipeline.save_trail_csv(csv_path, gpx_pipeline.table_to_rows(table))
+
+
+def write_track(dir_path, n):
+    gpx_path = os.path.join(dir_path, "track_%d.gpx" % n)
+    gpx_pipeline.write_gpx(gpx_path, [gpx_pipeline.points_to_columns(synthetic_points(n))])
+    return gpx_path
+
+
+def scaling_exponent(sizes, seconds):
+    # least-squares slope of log(time) against log(n); 1.0 means linear
+    xs = [math.log(n) for n in sizes]
+    ys = [math.log(t) for t in seconds]
+    mx = sum(xs) / len(xs)
+    my = sum(ys) / len(ys)
+    return (sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+            / sum((x - mx) ** 2 for x in xs))
+
+
+@pytest.fixture(scope="module")
+def timings(tmp_path_factory):
+    # {n: seconds for n points, fixed overhead already taken off}
+    dir_path = str(tmp_path_factory.mktemp("perf"))
+    csv_path = os.path.join(dir_path, "track.csv")
+
+    tiny = write_track(dir_path, 10)
+    overhead = best_of(lambda: run_pipeline(tiny, csv_path), repeat=5)
+
+    seconds = {}
+    for n in SIZES:
+        gpx_path = write_track(dir_path, n)
+        t = best_of(lambda: run_pipeline(gpx_path, csv_path))
+        seconds[n] = max(t - overhead, 1e-9)
+        os.remove(gpx_path)
+    return seconds
+
+
+def test_throughput(timings):
+    calib = calibration_ops_per_sec()
+    floor = MIN_POINTS_PER_CALIBRATION_OP * calib
+    for n, t in timings.items():
+        rate = n / t
+        assert rate >= floor, "%d points: %.0f points/s < %.0f (%g x calibration)" % (
+            n, rate, floor, MIN_POINTS_PER_CALIBRATION_OP)
+
+
+def test_time_grows_linearly(timings):
+    exponent = scaling_exponent(SIZES, [timings[n] for n in SIZES])
+    assert exponent <= MAX_SCALING_EXPONENT, "time grows as n^%.2f (> n^%.2f)" % (
+        exponent, MAX_SCALING_EXPONENT)
+
+
+def test_peak_memory_per_point(tmp_path):
+    gpx_path = write_track(str(tmp_path), MEMORY_SIZE)
+    csv_path = str(tmp_path / "track.csv")
+    tracemalloc.start()
+    try:
+        run_pipeline(gpx_path, csv_path)
+        per_point = tracemalloc.get_traced_memory()[1] / MEMORY_SIZE
+    finally:
+        tracemalloc.stop()
+    assert per_point <= MAX_BYTES_PER_POINT, "%.0f bytes/point > %d" % (
+        per_point, MAX_BYTES_PER_POINT)
+
+
+def test_script_does_not_reload_the_gpx():
+    with open(os.path.join(REPO_DIR, "Project code.py"), encoding="utf-8") as f:
+        code = [line for line in f if not line.lstrip().startswith("#")]
+    loads = sum(1 for line in code
+                if re.search(r"\bload_gpx_points\(", line) and not line.lstrip().startswith("def "))
+    assert loads <= MAX_SCRIPT_GPX_LOADS, "Project code.py calls load_gpx_points() %d times (max %d)" % (
+        loads, MAX_SCRIPT_GPX_LOADS)
@@ -0,0 +1,62 @@
+# GPS spike / teleport QC on the sample trail
+
+import pytest
+
+import gpx_pipeline
+import trail_analysis
+from conftest import SAMPLE_GPX
+
+
+def _sample():
+    return gpx_pipeline.load_gpx_points(SAMPLE_GPX)
+
+
+def test_clean_track_passes_untouched():
+    points = _sample()
+    kept, report = trail_analysis.qc_points(points)
+    assert kept == points
+    assert report["flagged_indices"] == []
+
+
+def test_spike_in_the_middle_is_dropped():
+    points = _sample()
+    points[50]["lat"] += 0.01
+    kept, report = trail_analysis.qc_points(points)
+    assert report["flagged_indices"] == [50]
+    assert kept == points[:50] + points[51:]
+
+
+def test_bad_first_fix_is_flagged_not_the_points_after_it():
+    # a cold-start fix 1.1 km off must not become the reference that the
+    # following good points get rejected against
+    points = _sample()
+    points[0]["lat"] += 0.01
+    kept, report = trail_analysis.qc_points(points)
+    assert report["flagged_indices"] == [0]
+    assert kept == points[1:]
+
+    marked, _ = trail_analysis.qc_points(points, drop=False)
+    assert [p["qc"] for p in marked[:2]] == ["speed", None]
+    assert len(marked) == len(points)
+
+
+@pytest.mark.parametrize("n_bad", [2, 3])
+def test_cluster_of_bad_first_fixes_is_flagged(n_bad):
+    # several cold-start fixes that agree with each other must not confirm
+    # one another and push the good track out as a "teleport"
+    points = _sample()
+    for p in points[:n_bad]:
+        p["lat"] += 0.01
+    kept, report = trail_analysis.qc_points(points)
+    assert report["flagged_indices"] == list(range(n_bad))
+    assert kept == points[n_bad:]
+
+
+def test_teleport_is_accepted_after_max_rejects():
+    points = _sample()
+    for p in points[80:]:
+        p["lat"] += 0.05
+    kept, report = trail_analysis.qc_points(points)
+    limit = trail_analysis.QC_LIMITS["max_rejects_in_row"]
+    assert report["flagged_indices"] == list(range(80, 80 + limit))
+    assert kept == points[:80] + points[80 + limit:]
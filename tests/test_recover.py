@@ -0,0 +1,74 @@
+# the streaming reader's recovery mode on broken files
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+HEAD = b'<?xml version="1.0"?>\n<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>\n'
+TAIL = b"</trkseg></trk></gpx>\n"
+
+
+def _write(tmp_path, data):
+    path = tmp_path / "broken.gpx"
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_truncated_file_keeps_every_whole_point(tmp_path):
+    with open(SAMPLE_GPX, "rb") as f:
+        data = f.read()
+    # cut in the middle of the 101st point
+    cut = data.index(b"<trkpt", data.index(b"<trkpt") + 1)
+    for _ in range(99):
+        cut = data.index(b"<trkpt", cut + 1)
+    cut += 20
+    path = _write(tmp_path, data[:cut])
+
+    points, report = gpx_pipeline.load_gpx_points_recover(path)
+
+    assert points == gpx_pipeline.load_gpx_points(SAMPLE_GPX)[:100]
+    assert report["complete"] is False
+    assert report["points"] == 100
+    assert report["reason"]
+    with pytest.raises(ET.ParseError):
+        list(gpx_pipeline.iter_gpx_points(path))
+
+
+def test_garbage_in_the_middle_reports_its_offset(tmp_path):
+    data = (HEAD + b'<trkpt lat="1" lon="2"/>\n<trkpt lat="3" lon="4"/> <<garbage>>\n'
+            + b'<trkpt lat="5" lon="6"/>\n' + TAIL)
+    path = _write(tmp_path, data)
+
+    points, report = gpx_pipeline.load_gpx_points_recover(path)
+
+    assert [(p["lat"], p["lon"]) for p in points] == [(1.0, 2.0), (3.0, 4.0)]
+    assert report["complete"] is False
+    assert report["error_line"] == 4
+    garbage = data.index(b"<<garbage")
+    assert garbage <= report["error_offset"] <= garbage + 1
+
+
+def test_bad_numbers_are_counted_and_skipped(tmp_path):
+    data = (HEAD
+            + b'<trkpt lat="1" lon="2"><ele>10</ele></trkpt>\n'
+            + b'<trkpt lat="north" lon="2"><ele>11</ele></trkpt>\n'   # bad lat
+            + b'<trkpt lat="1" lon="200"><ele>12</ele></trkpt>\n'     # lon out of range
+            + b'<trkpt lat="95" lon="x"></trkpt>\n'                    # both bad
+            + b'<trkpt lat="1.5" lon="2.5"><ele>high</ele></trkpt>\n'  # bad ele
+            + b'<trkpt lat="1.6" lon="2.6"><ele>nan</ele></trkpt>\n'   # ele not finite
+            + b'<trkpt lat="1.7" lon="2.7"><ele>13</ele></trkpt>\n'
+            + TAIL)
+    path = _write(tmp_path, data)
+
+    points, report = gpx_pipeline.load_gpx_points_recover(path)
+
+    assert [(p["lat"], p["ele"]) for p in points] == [(1.0, 10.0), (1.5, None), (1.6, None), (1.7, 13.0)]
+    assert report["complete"] is True
+    assert report["points"] == 4
+    assert report["bad_lat"] == 2
+    assert report["bad_lon"] == 2
+    assert report["bad_ele"] == 2
+    assert report["skipped_points"] == 3
@@ -0,0 +1,70 @@
+# the memory-mapped scanner against the ElementTree reader
+
+import pytest
+
+import gpx_pipeline
+from conftest import SAMPLE_GPX
+
+# every way the fast layout can be missed: a gpx: prefix, single quotes,
+# lon before lat, extra children, a self-closing point, entities, comments
+# and CDATA (with a point inside each that must not be read)
+MIXED_GPX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx:gpx xmlns:gpx="http://www.topografix.com/GPX/1/1" version="1.1"><gpx:trk><gpx:trkseg>
+<gpx:trkpt lat="38.1" lon="-87.1"><gpx:ele>168.5</gpx:ele><gpx:time>2025-11-12T10:00:00Z</gpx:time></gpx:trkpt>
+<!-- <gpx:trkpt lat="1.0" lon="1.0"><gpx:ele>1</gpx:ele></gpx:trkpt> -->
+<gpx:trkpt lon='-87.2' lat='38.2'><gpx:extensions><x/></gpx:extensions><gpx:ele>170</gpx:ele></gpx:trkpt>
+<gpx:trkpt lat="38.3" lon="-87.3"/>
+<gpx:desc><![CDATA[ <gpx:trkpt lat="2.0" lon="2.0"></gpx:trkpt> ]]></gpx:desc>
+<gpx:trkpt lat="&#51;8.4" lon="-87.4"><gpx:time>2025-11-12T10:00:03Z &amp; later</gpx:time></gpx:trkpt>
+<gpx:trkpt lat="38.5" lon="-87.5">
+  <gpx:ele> 171.25 </gpx:ele>
+  <gpx:time>
+    2025-11-12T10:00:04Z
+  </gpx:time>
+</gpx:trkpt>
+</gpx:trkseg></gpx:trk></gpx:gpx>
+"""
+
+# the usual layout with one point that is not, so the fast path has to give
+# the whole range to the general loop
+PLAIN_POINT = b'<trkpt lat="%d.5" lon="-87.%d"><ele>%d.25</ele><time>2025-11-12T10:00:%02dZ</time></trkpt>\n'
+ODD_POINT = b'<trkpt lon="-87.9" lat="38.9"><ele>1</ele></trkpt>\n'
+
+
+def _agree(gpx_path):
+    columns = gpx_pipeline.load_gpx_columns(gpx_path)
+    expected = gpx_pipeline.points_to_columns(list(gpx_pipeline.iter_gpx_points(gpx_path)))
+    assert columns == expected
+    return columns
+
+
+def test_sample_file():
+    assert len(_agree(SAMPLE_GPX)["lat"]) > 0
+
+
+def test_mixed_layouts_comments_and_entities(tmp_path):
+    path = tmp_path / "mixed.gpx"
+    path.write_bytes(MIXED_GPX)
+    columns = _agree(str(path))
+    assert columns["lat"] == [38.1, 38.2, 38.3, 38.4, 38.5]
+    assert columns["time"][3] == "2025-11-12T10:00:03Z & later"
+
+
+@pytest.mark.parametrize("odd_at", [None, 0, 25, 49])
+def test_fast_and_general_paths_agree(tmp_path, odd_at):
+    points = [PLAIN_POINT % (i, i, i, i) for i in range(50)]
+    if odd_at is not None:
+        points[odd_at] = ODD_POINT
+    path = tmp_path / "plain.gpx"
+    path.write_bytes(b'<?xml version="1.0"?>\n<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+                     b"<trk><trkseg>\n" + b"".join(points) + b"</trkseg></trk></gpx>\n")
+    assert len(_agree(str(path))["lat"]) == 50
+
+
+def test_scan_returns_the_end_of_the_last_whole_point():
+    data = (b"<gpx><trk><trkseg>" + PLAIN_POINT % (1, 1, 1, 1) + PLAIN_POINT % (2, 2, 2, 2)
+            + b'<trkpt lat="3')
+    columns, offset = gpx_pipeline.scan_trkpts(data)
+    assert columns["lat"] == [1.5, 2.5]
+    assert data[:offset].endswith(b"</trkpt>")
+    assert data[offset:].lstrip().startswith(b"<trkpt")
@@ -0,0 +1,41 @@
+# Workers attaching to shared columns must not disturb the parent's resource
+# tracker: no KeyError tracebacks or "leaked shared_memory" warnings, with
+# fork or spawn workers. The tracker only talks on stderr, so the pool runs
+# in a child interpreter.
+
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+
+SCRIPT = """
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import gpx_pipeline
+from benchmarks import synthetic_points
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method(sys.argv[1])
+    points = synthetic_points(2000)
+    expected = gpx_pipeline.compute_trail_stats(points)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        with gpx_pipeline.shared_columns(gpx_pipeline.points_to_columns(points)) as descriptor:
+            results = list(pool.map(gpx_pipeline.shared_trail_stats, [descriptor] * 4))
+    for r in results:
+        assert all(abs(a - b) < 1e-6 for a, b in zip(r, expected)), (r, expected)
+    print("ok")
+"""
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_workers_leave_the_resource_tracker_alone(start_method):
+    result = subprocess.run([sys.executable, "-c", SCRIPT, start_method], cwd=REPO_DIR,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
+    assert "KeyError" not in result.stderr
+    assert "leaked" not in result.stderr
@@ -0,0 +1,72 @@
+# per-km and per-minute splits on the sample trail
+
+import pytest
+
+import gpx_pipeline
+import trail_analysis
+from conftest import SAMPLE_GPX
+
+
+def _table():
+    table, total_distance, total_gain = gpx_pipeline.build_trail_columns(
+        gpx_pipeline.load_gpx_columns(SAMPLE_GPX))
+    return table, total_distance, total_gain
+
+
+def _elapsed(table):
+    seconds = [s for s in trail_analysis.table_seconds(table) if s is not None]
+    return seconds[-1] - seconds[0]
+
+
+def _check_totals(splits, table, total_distance, total_gain):
+    assert sum(s["distance_m"] for s in splits) == pytest.approx(total_distance)
+    assert sum(s["gain_m"] for s in splits) == pytest.approx(total_gain)
+    assert sum(s["duration_s"] for s in splits) == pytest.approx(_elapsed(table))
+    # splits cover every point once, in order, sharing no points
+    assert splits[0]["start_index"] == 0
+    assert splits[-1]["end_index"] == len(table["lat"]) - 1
+    for a, b in zip(splits, splits[1:]):
+        assert b["start_index"] == a["end_index"] + 1
+
+
+@pytest.mark.parametrize("by, size", [("distance", 1000.0), ("distance", 250.0),
+                                      ("time", 60.0), ("time", 7.0)])
+def test_split_totals_match_the_track(by, size):
+    table, total_distance, total_gain = _table()
+    rows = gpx_pipeline.table_to_rows(table)
+    splits = list(trail_analysis.iter_splits(rows, by, size))
+    assert [s["split"] for s in splits] == sorted(s["split"] for s in splits)
+    _check_totals(splits, table, total_distance, total_gain)
+
+
+def test_per_km_splits():
+    table, total_distance, _ = _table()
+    splits = trail_analysis.rollup_by_distance(table, 1000.0)
+    assert [s["split"] for s in splits] == [1, 2, 3]
+    for s in splits[:-1]:
+        # each split runs to the first point past its kilometre mark
+        assert s["distance_m"] == pytest.approx(1000.0, abs=30.0)
+    assert splits[-1]["distance_m"] == pytest.approx(total_distance - 2000.0, abs=60.0)
+
+
+def test_time_splits_with_missing_times():
+    table, total_distance, total_gain = _table()
+    times = list(table["time"])
+    times[0] = None            # no time before the first known one
+    for i in (59, 60, 61, 100):
+        times[i] = None
+    times[120] = "garbage"
+    table["time"] = times
+
+    splits = trail_analysis.rollup_by_time(table, 60.0)
+    _check_totals(splits, table, total_distance, total_gain)
+    # a point without a time stays in the split that is open when it arrives
+    for i in (0, 59, 60, 61, 100, 120):
+        owner = [s for s in splits if s["start_index"] <= i <= s["end_index"]]
+        assert len(owner) == 1
+        assert owner[0]["start_index"] < i or i == 0
+
+
+def test_bad_split_kind():
+    with pytest.raises(ValueError):
+        list(trail_analysis.iter_splits([], "pace", 60.0))
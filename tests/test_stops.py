@@ -0,0 +1,92 @@
+# stop detection, moving time and laps on a synthetic track with known stops
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import gpx_pipeline
+import trail_analysis
+
+DEG_PER_M = math.degrees(1.0 / gpx_pipeline.R)   # degrees of latitude per meter
+T0 = datetime(2025, 11, 12, 9, 0, 0, tzinfo=timezone.utc)
+
+
+def _track(legs):
+    # legs: (seconds, speed in m/s) walked due north at 1 Hz
+    lats, times = [45.0], [T0]
+    for seconds, speed in legs:
+        for _ in range(seconds):
+            lats.append(lats[-1] + speed * DEG_PER_M)
+            times.append(times[-1] + timedelta(seconds=1))
+    columns = {
+        "lat": lats,
+        "lon": [7.0] * len(lats),
+        "ele": [100.0] * len(lats),
+        "time": [t.isoformat() for t in times]
+    }
+    table, _, _ = gpx_pipeline.build_trail_columns(columns)
+    return table
+
+
+def test_known_stop():
+    # 100 s walking, a 60 s stop, then 10 s of dawdling between two walks:
+    # too short to be a stop, so it counts as moving
+    table = _track([(100, 2.0), (60, 0.0), (50, 2.0), (10, 0.2), (50, 2.0)])
+    result = trail_analysis.segment_trail(table, stop_speed=0.5, min_stop_s=30.0)
+
+    assert result["elapsed_time_s"] == 270.0
+    assert result["stopped_time_s"] == 60.0
+    assert result["moving_time_s"] == 210.0
+    assert len(result["stops"]) == 1
+    stop = result["stops"][0]
+    assert (stop["start_index"], stop["end_index"]) == (100, 160)
+    assert stop["duration_s"] == 60.0
+    assert stop["distance_m"] == pytest.approx(0.0, abs=1e-6)
+    assert stop["lat"] == table["lat"][100]
+
+
+def test_stop_at_the_end_and_gaps_in_time():
+    table = _track([(50, 2.0), (40, 0.1)])
+    times = list(table["time"])
+    times[20] = None           # a missing time splits no run and adds no time
+    table["time"] = times
+
+    stops, moving, moving_time, stopped_time = trail_analysis.detect_stops(table)
+    assert [(s["start_index"], s["end_index"]) for s in stops] == [(50, 90)]
+    assert stopped_time == 40.0
+    assert moving_time == 48.0
+    assert moving[1:51] == [True] * 50
+    assert moving[51:] == [False] * 40
+
+
+def test_laps_by_distance_and_moving_time():
+    table = _track([(100, 2.0), (60, 0.0), (100, 2.0)])
+    result = trail_analysis.segment_trail(table, lap_distance_m=150.0)
+    laps = result["laps"]
+
+    assert [lap["lap"] for lap in laps] == [1, 2, 3]
+    first, second, third = laps
+    # a lap closes on the first point at or past 150 m
+    assert first["end_index"] == 75
+    assert first["distance_m"] == pytest.approx(150.0, abs=0.01)
+    assert first["elapsed_s"] == first["moving_s"] == 75.0
+    # the second lap holds the stop: elapsed counts it, moving time does not
+    assert (second["start_index"], second["end_index"]) == (75, 210)
+    assert second["elapsed_s"] == 135.0
+    assert second["moving_s"] == 75.0
+    # the last lap is what is left over
+    assert (third["start_index"], third["end_index"]) == (210, 260)
+    assert third["distance_m"] == pytest.approx(100.0, abs=0.01)
+    assert sum(lap["distance_m"] for lap in laps) == pytest.approx(table["cum_dist_m"][-1])
+
+
+def test_laps_by_time():
+    table = _track([(100, 2.0)])
+    laps = trail_analysis.split_laps(table, lap_time_s=30.0)
+    assert [(lap["start_index"], lap["end_index"]) for lap in laps] == [
+        (0, 30), (30, 60), (60, 90), (90, 100)]
+    assert [lap["elapsed_s"] for lap in laps] == [30.0, 30.0, 30.0, 10.0]
+
+    with pytest.raises(ValueError):
+        trail_analysis.split_laps(table, lap_distance_m=100.0, lap_time_s=30.0)
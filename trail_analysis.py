@@ -0,0 +1,495 @@
+# trail_analysis.py
+# Extra analysis on top of a columnar trail table from gpx_pipeline
+# (build_trail_columns / load_trail_table_parallel). Every function walks the
+# table front to back once, so it keeps working on multi-million point tracks.
+
+from datetime import datetime
+
+
+def parse_gpx_time(time_text):
+    # GPX times look like 2025-11-12T09:18:43-08:00 or 2025-11-12T09:18:43Z
+    if not time_text:
+        return None
+    try:
+        return datetime.fromisoformat(time_text).timestamp()
+    except ValueError:
+        return None
+
+
+def table_seconds(table):
+    # the time column as seconds (None where the time is missing or broken)
+    return [parse_gpx_time(time_text) for time_text in table["time"]]
+
+
+# ---------------------------------------------------------------------------
+# Stops and moving time
+# ---------------------------------------------------------------------------
+
+def detect_stops(table, stop_speed=0.5, min_stop_s=30.0, seconds=None):
+    # A stop is a run of segments slower than stop_speed (m/s) that lasts at
+    # least min_stop_s seconds. Shorter slow runs count as moving time.
+    # Returns the stops, a per-segment "moving" flag (index i is the segment
+    # from point i-1 to point i), and the moving / stopped time in seconds.
+    if seconds is None:
+        seconds = table_seconds(table)
+    seg_dists = table["seg_dist_m"]
+    n = len(seg_dists)
+
+    moving = [True] * n
+    stops = []
+    moving_time = 0.0
+    stopped_time = 0.0
+
+    run_start = None   # index of the first slow segment in the current run
+    run_time = 0.0
+    run_dist = 0.0
+
+    def close_run(end):
+        nonlocal moving_time, stopped_time
+        if run_time >= min_stop_s:
+            stopped_time += run_time
+            for j in range(run_start, end):
+                moving[j] = False
+            stops.append({
+                "start_index": run_start - 1,
+                "end_index": end - 1,
+                "start_time": table["time"][run_start - 1],
+                "duration_s": run_time,
+                "distance_m": run_dist,
+                "lat": table["lat"][run_start - 1],
+                "lon": table["lon"][run_start - 1]
+            })
+        else:
+            moving_time += run_time
+
+    for i in range(1, n):
+        t_prev = seconds[i - 1]
+        t_curr = seconds[i]
+        if t_prev is None or t_curr is None or t_curr <= t_prev:
+            continue
+        dt = t_curr - t_prev
+
+        if seg_dists[i] / dt < stop_speed:
+            if run_start is None:
+                run_start = i
+                run_time = 0.0
+                run_dist = 0.0
+            run_time += dt
+            run_dist += seg_dists[i]
+        else:
+            if run_start is not None:
+                close_run(i)
+                run_start = None
+            moving_time += dt
+
+    if run_start is not None:
+        close_run(n)
+
+    return stops, moving, moving_time, stopped_time
+
+
+# ---------------------------------------------------------------------------
+# Auto laps
+# ---------------------------------------------------------------------------
+
+def split_laps(table, lap_distance_m=None, lap_time_s=None, seconds=None, moving=None):
+    # Cut the track into laps every lap_distance_m meters or every lap_time_s
+    # seconds (exactly one of the two). A lap ends on the first point that
+    # reaches the limit; the last lap holds whatever is left over.
+    if (lap_distance_m is None) == (lap_time_s is None):
+        raise ValueError("give exactly one of lap_distance_m or lap_time_s")
+    if seconds is None:
+        seconds = table_seconds(table)
+    n = len(table["lat"])
+    if n == 0:
+        return []
+
+    cum_dist = table["cum_dist_m"]
+    cum_gain = table["cum_gain_m"]
+
+    laps = []
+    start = 0
+    lap_moving = 0.0
+    t_start = seconds[0]
+
+    def add_lap(end):
+        elapsed = None
+        if seconds[start] is not None and seconds[end] is not None:
+            elapsed = seconds[end] - seconds[start]
+        distance = cum_dist[end] - cum_dist[start]
+        gain = cum_gain[end] - cum_gain[start]
+        laps.append({
+            "lap": len(laps) + 1,
+            "start_index": start,
+            "end_index": end,
+            "distance_m": distance,
+            "gain_m": gain,
+            "avg_grade": (gain / distance) if distance > 0 else 0.0,
+            "elapsed_s": elapsed,
+            "moving_s": lap_moving if moving is not None else elapsed
+        })
+
+    for i in range(1, n):
+        if moving is not None and moving[i]:
+            t_prev = seconds[i - 1]
+            t_curr = seconds[i]
+            if t_prev is not None and t_curr is not None and t_curr > t_prev:
+                lap_moving += t_curr - t_prev
+
+        if lap_distance_m is not None:
+            done = cum_dist[i] - cum_dist[start] >= lap_distance_m
+        else:
+            if t_start is None:
+                t_start = seconds[i]
+            done = (t_start is not None and seconds[i] is not None
+                    and seconds[i] - t_start >= lap_time_s)
+
+        if done:
+            add_lap(i)
+            start = i
+            lap_moving = 0.0
+            t_start = seconds[i]
+
+    if start < n - 1:
+        add_lap(n - 1)
+    return laps
+
+
+def segment_trail(table, stop_speed=0.5, min_stop_s=30.0,
+                  lap_distance_m=None, lap_time_s=None):
+    # stops, moving/stopped time and (optionally) laps for one trail table
+    seconds = table_seconds(table)
+    stops, moving, moving_time, stopped_time = detect_stops(
+        table, stop_speed, min_stop_s, seconds)
+
+    known = [s for s in seconds if s is not None]
+    elapsed = (known[-1] - known[0]) if len(known) > 1 else 0.0
+
+    laps = []
+    if lap_distance_m is not None or lap_time_s is not None:
+        laps = split_laps(table, lap_distance_m, lap_time_s, seconds, moving)
+
+    return {
+        "elapsed_time_s": elapsed,
+        "moving_time_s": moving_time,
+        "stopped_time_s": stopped_time,
+        "stops": stops,
+        "laps": laps
+    }
+
+
+# ---------------------------------------------------------------------------
+# Quality control: spikes, teleports and duplicate points
+#
+# Real device tracks contain position spikes: one point jumps 200 m sideways
+# and back, and haversine happily adds 400 m of phantom distance. The QC stage
+# checks every point against the last point it kept and rejects it when the
+# implied speed, acceleration or elevation change is impossible. Exact repeats
+# of the previous point (a stationary device logging at 1 Hz) are collapsed.
+# It is a generator over point dictionaries, so it can sit directly between
+# the streaming reader and the table:
+#     report = new_qc_report()
+#     points = iter_qc_points(gpx_pipeline.iter_gpx_points(path), report=report)
+# ---------------------------------------------------------------------------
+
+QC_LIMITS = {
+    "max_speed": 50.0,        # m/s, about 180 km/h
+    "max_accel": 30.0,        # m/s^2, loose because 1 Hz GPS speeds are noisy
+    "max_ele_rate": 10.0,     # m/s of climb or descent
+    "max_ele_jump": 50.0,     # m between two points, used when there is no time
+    "max_jump_m": 1000.0,     # m between two points, used when there is no time
+    "max_rejects_in_row": 5   # after this many, trust the new position (signal came back elsewhere)
+}
+
+
+def new_qc_report():
+    return {
+        "points_in": 0,
+        "points_out": 0,
+        "duplicates": 0,
+        "speed": 0,
+        "accel": 0,
+        "elevation": 0,
+        "jump": 0,
+        "flagged_indices": []
+    }
+
+
+def _qc_problem(last, last_t, last_speed, p, t, cfg):
+    # (name of the failed check or None, implied speed or None) for p
+    # following the reference point last
+    from gpx_pipeline import haversine_distance
+
+    dist = haversine_distance(last["lat"], last["lon"], p["lat"], p["lon"])
+    dele = None
+    if p["ele"] is not None and last["ele"] is not None:
+        dele = abs(p["ele"] - last["ele"])
+
+    dt = (t - last_t) if (t is not None and last_t is not None) else None
+    if dt is not None and dt > 0:
+        speed = dist / dt
+        if speed > cfg["max_speed"]:
+            return "speed", speed
+        if last_speed is not None and abs(speed - last_speed) / dt > cfg["max_accel"]:
+            return "accel", speed
+        if dele is not None and dele / dt > cfg["max_ele_rate"]:
+            return "elevation", speed
+        return None, speed
+
+    if dist > cfg["max_jump_m"]:
+        return "jump", None
+    if dele is not None and dele > cfg["max_ele_jump"]:
+        return "elevation", None
+    return None, None
+
+
+def _qc_consistent(group, cfg):
+    # do these (index, point, seconds, problem) rejects agree with each other?
+    for (_, a, a_t, _), (_, b, b_t, _) in zip(group, group[1:]):
+        if _qc_problem(a, a_t, None, b, b_t, cfg)[0] is not None:
+            return False
+    return True
+
+
+def iter_qc_points(points, drop=True, report=None, **limits):
+    # drop=True leaves bad points out; drop=False keeps them with a "qc" key
+    # naming the failed check (None for good points). Duplicates are always
+    # left out.
+    #
+    # The points kept since the start (or since a teleport) form a run. Until
+    # the run is longer than max_rejects_in_row it is held back, together
+    # with the points that failed against it. If max_rejects_in_row points in
+    # a row fail against such a short run, plus the next one, and they all
+    # agree with each other, the run was the bad part (a cluster of cold-start
+    # fixes): its first point is flagged and everything after it is checked
+    # again from scratch. Against a longer run the same thing means the track
+    # really moved, and the new position starts a new run.
+    from collections import deque
+
+    if report is None:
+        report = new_qc_report()
+    cfg = dict(QC_LIMITS)
+    for name in limits:
+        if name not in cfg:
+            raise TypeError("unknown QC limit %r" % (name,))
+    cfg.update(limits)
+    max_rejects = cfg["max_rejects_in_row"]
+
+    def good(p):
+        report["points_out"] += 1
+        if not drop:
+            p = dict(p)
+            p["qc"] = None
+        return p
+
+    def flag(index, p, problem):
+        # the flagged copy to yield, or None when bad points are dropped
+        report[problem] += 1
+        report["flagged_indices"].append(index)
+        if drop:
+            return None
+        report["points_out"] += 1
+        flagged = dict(p)
+        flagged["qc"] = problem
+        return flagged
+
+    def release(run, held):
+        # a held run and its rejects, in track order
+        out = [(i, p, None) for i, p in run] + held
+        out.sort(key=lambda item: item[0])
+        for i, p, problem in out:
+            item = good(p) if problem is None else flag(i, p, problem)
+            if item is not None:
+                yield item
+
+    last = None          # the reference: last point that was kept
+    last_t = None
+    last_speed = None
+    run = []             # (index, point) of the current run while it is held
+    established = False  # is the run longer than max_rejects yet?
+    held = []            # (index, point, problem) failed against a held run
+    streak = []          # (index, point, seconds, problem) rejects in a row
+    retry = deque()      # points to check again after a run was overturned
+    source = enumerate(points)
+
+    while True:
+        if retry:
+            index, p = retry.popleft()
+        else:
+            item = next(source, None)
+            if item is None:
+                break
+            index, p = item
+            report["points_in"] += 1
+        t = parse_gpx_time(p["time"])
+
+        problem = None
+        speed = None
+        if last is not None:
+            if (p["lat"] == last["lat"] and p["lon"] == last["lon"]
+                    and p["ele"] == last["ele"]):
+                report["duplicates"] += 1
+                continue
+            problem, speed = _qc_problem(last, last_t, last_speed, p, t, cfg)
+
+        if problem is not None:
+            if len(streak) < max_rejects:
+                streak.append((index, p, t, problem))
+                if established:
+                    flagged = flag(index, p, problem)
+                    if flagged is not None:
+                        yield flagged
+                else:
+                    held.append((index, p, problem))
+                continue
+
+            group = streak + [(index, p, t, problem)]
+            if not established and _qc_consistent(group, cfg):
+                # the short run was the outlier
+                first_index, first = run[0]
+                flagged = flag(first_index, first, streak[0][3])
+                if flagged is not None:
+                    yield flagged
+                again = run[1:] + [(i, q) for i, q, _ in held] + [(index, p)]
+                again.sort(key=lambda item: item[0])
+                retry.extendleft(reversed(again))
+                last = None
+                last_t = None
+                last_speed = None
+                run = []
+                held = []
+                streak = []
+                continue
+
+            # the track really moved: this point starts a new run
+            if not established:
+                yield from release(run, held)
+            run = []
+            held = []
+            established = False
+            speed = None  # the jump itself is not a speed to compare against
+
+        streak = []
+        last = p
+        last_t = t if t is not None else last_t
+        last_speed = speed
+        if established:
+            yield good(p)
+        else:
+            run.append((index, p))
+            if len(run) > max_rejects:
+                established = True
+                yield from release(run, held)
+                run = []
+                held = []
+
+    if not established:
+        # the track ended while the run was still held
+        yield from release(run, held)
+
+
+def qc_points(points, drop=True, **limits):
+    # returns (kept points, report)
+    report = new_qc_report()
+    kept = list(iter_qc_points(points, drop=drop, report=report, **limits))
+    return kept, report
+
+
+def save_qc_report(json_path, report):
+    import json
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+
+# ---------------------------------------------------------------------------
+# Splits: per-kilometre / per-minute rollups
+#
+# Instead of one row per point, one row per split: every split_m meters of
+# cum_dist_m, or every split_s seconds since the first point. A point belongs
+# to the split its cum_dist_m (or time) falls in, and the segment leading up
+# to it is counted there too. iter_splits() is the streaming version: it
+# takes trail rows one at a time (for example from the live mode) and yields
+# each split as soon as the next one starts. rollup_by_distance() and
+# rollup_by_time() do the same over a whole columnar table.
+# The result goes to gpx_pipeline.save_trail_csv(path, splits, SPLIT_HEADERS)
+# or, via splits_to_table(), to gpx_pipeline.save_trail_columns().
+# ---------------------------------------------------------------------------
+
+SPLIT_HEADERS = [
+    "split", "start_index", "end_index", "start_time",
+    "distance_m", "gain_m", "avg_grade", "duration_s"
+]
+
+
+def iter_splits(rows, by="distance", size=1000.0):
+    # rows: dictionaries with index, cum_dist_m, cum_gain_m and time
+    if by not in ("distance", "time"):
+        raise ValueError("by must be 'distance' or 'time', got %r" % (by,))
+
+    current = None     # bucket number of the open split
+    split = None
+    t0 = None
+    prev = None        # (cum_dist, cum_gain, seconds) of the point before
+
+    def finish(s):
+        s["avg_grade"] = (s["gain_m"] / s["distance_m"]) if s["distance_m"] > 0 else 0.0
+        return s
+
+    for row in rows:
+        seconds = parse_gpx_time(row["time"])
+        if t0 is None and seconds is not None:
+            t0 = seconds
+
+        if by == "distance":
+            bucket = int(row["cum_dist_m"] // size)
+        elif seconds is not None:
+            bucket = int((seconds - t0) // size)
+        else:
+            bucket = current if current is not None else 0
+
+        if bucket != current:
+            if split is not None:
+                yield finish(split)
+            current = bucket
+            split = {
+                "split": bucket + 1,
+                "start_index": row["index"],
+                "end_index": row["index"],
+                "start_time": row["time"],
+                "distance_m": 0.0,
+                "gain_m": 0.0,
+                "avg_grade": 0.0,
+                "duration_s": 0.0
+            }
+
+        if prev is not None:
+            split["distance_m"] += row["cum_dist_m"] - prev[0]
+            split["gain_m"] += row["cum_gain_m"] - prev[1]
+            if seconds is not None and prev[2] is not None:
+                split["duration_s"] += seconds - prev[2]
+        split["end_index"] = row["index"]
+        if seconds is None and prev is not None:
+            seconds = prev[2]  # keep timing from the last point that had a time
+        prev = (row["cum_dist_m"], row["cum_gain_m"], seconds)
+
+    if split is not None:
+        yield finish(split)
+
+
+def _table_rows(table):
+    names = ("index", "cum_dist_m", "cum_gain_m", "time")
+    return (dict(zip(names, values)) for values in zip(*(table[n] for n in names)))
+
+
+def rollup_by_distance(table, split_m=1000.0):
+    return list(iter_splits(_table_rows(table), "distance", split_m))
+
+
+def rollup_by_time(table, split_s=60.0):
+    return list(iter_splits(_table_rows(table), "time", split_s))
+
+
+def splits_to_table(splits):
+    # list of split rows -> columns, for gpx_pipeline.save_trail_columns()
+    return {name: [s[name] for s in splits] for name in SPLIT_HEADERS}
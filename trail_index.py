@@ -0,0 +1,175 @@
+# trail_index.py
+# A small SQLite file that remembers one summary row per converted GPX file
+# (totals, bounding box, start point, point count, time range). Questions like
+# "5-10 km with more than 200 m gain" or "closest trailheads to here" then
+# read the index instead of re-parsing thousands of GPX files.
+
+import math
+import os
+import sqlite3
+
+from gpx_pipeline import R, haversine_distance
+from trail_analysis import parse_gpx_time
+
+SUMMARY_FIELDS = [
+    "gpx_path", "csv_path", "file_size", "file_mtime",
+    "point_count", "distance_m", "gain_m", "avg_grade",
+    "min_lat", "max_lat", "min_lon", "max_lon",
+    "start_lat", "start_lon", "start_time", "end_time", "start_ts", "end_ts"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trails (
+    gpx_path    TEXT PRIMARY KEY,
+    csv_path    TEXT,
+    file_size   INTEGER,
+    file_mtime  REAL,
+    point_count INTEGER,
+    distance_m  REAL,
+    gain_m      REAL,
+    avg_grade   REAL,
+    min_lat     REAL,
+    max_lat     REAL,
+    min_lon     REAL,
+    max_lon     REAL,
+    start_lat   REAL,
+    start_lon   REAL,
+    start_time  TEXT,
+    end_time    TEXT,
+    start_ts    REAL,
+    end_ts      REAL
+);
+CREATE INDEX IF NOT EXISTS trails_distance ON trails (distance_m);
+CREATE INDEX IF NOT EXISTS trails_gain ON trails (gain_m);
+CREATE INDEX IF NOT EXISTS trails_start ON trails (start_lat, start_lon);
+"""
+
+
+def open_trail_index(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def trail_summary(gpx_path, table, total_distance, total_gain, csv_path=None):
+    lats = table["lat"]
+    lons = table["lon"]
+    n = len(lats)
+
+    times = [t for t in table["time"] if t]
+    start_time = times[0] if times else None
+    end_time = times[-1] if times else None
+
+    stat = os.stat(gpx_path)
+    return {
+        "gpx_path": os.path.abspath(gpx_path),
+        "csv_path": csv_path,
+        "file_size": stat.st_size,
+        "file_mtime": stat.st_mtime,
+        "point_count": n,
+        "distance_m": total_distance,
+        "gain_m": total_gain,
+        "avg_grade": (total_gain / total_distance) if total_distance > 0 else 0.0,
+        "min_lat": min(lats) if n else None,
+        "max_lat": max(lats) if n else None,
+        "min_lon": min(lons) if n else None,
+        "max_lon": max(lons) if n else None,
+        "start_lat": lats[0] if n else None,
+        "start_lon": lons[0] if n else None,
+        "start_time": start_time,
+        "end_time": end_time,
+        "start_ts": parse_gpx_time(start_time),
+        "end_ts": parse_gpx_time(end_time)
+    }
+
+
+def index_trail(conn, summary):
+    placeholders = ", ".join("?" for _ in SUMMARY_FIELDS)
+    conn.execute(
+        "INSERT OR REPLACE INTO trails (%s) VALUES (%s)" % (", ".join(SUMMARY_FIELDS), placeholders),
+        [summary[f] for f in SUMMARY_FIELDS]
+    )
+    conn.commit()
+
+
+def is_up_to_date(conn, gpx_path):
+    # True when the file was already indexed and has not changed since
+    row = conn.execute(
+        "SELECT file_size, file_mtime FROM trails WHERE gpx_path = ?",
+        (os.path.abspath(gpx_path),)
+    ).fetchone()
+    if row is None:
+        return False
+    stat = os.stat(gpx_path)
+    return row["file_size"] == stat.st_size and row["file_mtime"] == stat.st_mtime
+
+
+def find_trails(conn, min_distance_m=None, max_distance_m=None,
+                min_gain_m=None, max_gain_m=None, bbox=None):
+    # bbox is (min_lat, min_lon, max_lat, max_lon); trails must start inside it
+    where = []
+    args = []
+    for column, op, value in (
+        ("distance_m", ">=", min_distance_m),
+        ("distance_m", "<=", max_distance_m),
+        ("gain_m", ">=", min_gain_m),
+        ("gain_m", "<=", max_gain_m)
+    ):
+        if value is not None:
+            where.append("%s %s ?" % (column, op))
+            args.append(value)
+    if bbox is not None:
+        where.append("start_lat BETWEEN ? AND ? AND start_lon BETWEEN ? AND ?")
+        args.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+
+    sql = "SELECT * FROM trails"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY distance_m"
+    return [dict(row) for row in conn.execute(sql, args)]
+
+
+def nearest_trailheads(conn, lat, lon, k=5, max_distance_m=None):
+    # Look in a small box around (lat, lon) first (the start_lat/start_lon
+    # index makes that cheap) and double the box until it holds k trails,
+    # then sort those few by real haversine distance.
+    total = conn.execute("SELECT COUNT(*) FROM trails").fetchone()[0]
+    want = min(k, total)
+    if want == 0:
+        return []
+
+    radius = 1000.0
+    while True:
+        dlat = math.degrees(radius / R)
+        coslat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = math.degrees(radius / (R * coslat))
+        if dlon >= 180.0 or abs(lon) + dlon > 180.0:
+            # the box wraps around the 180th meridian, so only filter by latitude
+            rows = conn.execute(
+                "SELECT * FROM trails WHERE start_lat BETWEEN ? AND ?",
+                (lat - dlat, lat + dlat)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM trails WHERE start_lat BETWEEN ? AND ? AND start_lon BETWEEN ? AND ?",
+                (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+            ).fetchall()
+
+        hits = []
+        for row in rows:
+            d = haversine_distance(lat, lon, row["start_lat"], row["start_lon"])
+            if d <= radius:
+                item = dict(row)
+                item["trailhead_distance_m"] = d
+                hits.append(item)
+
+        done = len(hits) >= want or radius >= math.pi * R
+        if max_distance_m is not None and radius >= max_distance_m:
+            done = True
+        if done:
+            hits.sort(key=lambda item: item["trailhead_distance_m"])
+            if max_distance_m is not None:
+                hits = [h for h in hits if h["trailhead_distance_m"] <= max_distance_m]
+            return hits[:k]
+        radius *= 2
@@ -0,0 +1,196 @@
+# trail_match.py
+# Finding the same trail among many uploaded rides.
+#
+# Comparing two raw tracks point by point is n*m haversine calls, far too slow
+# for 100k stored tracks. Instead every track is boiled down to a signature:
+# SIGNATURE_POINTS positions spaced evenly along its cum_dist_m. A new upload
+# is then only compared with tracks that start (or end, if ridden backwards)
+# near the same place and have a similar length, found through a dictionary
+# of grid cells. Those few candidates are confirmed with a banded discrete
+# Frechet distance between the signatures: "how far apart do the two tracks
+# ever get, walking both from start to end".
+
+import json
+import math
+
+from gpx_pipeline import R, local_xy
+
+SIGNATURE_POINTS = 64
+CELL_M = 250.0             # size of the start/end grid cells
+LENGTH_TOLERANCE = 0.15    # lengths may differ by this fraction
+MATCH_DISTANCE_M = 60.0    # Frechet distance that still counts as "the same trail"
+BAND = 6                   # how far the two walks may get out of step (in signature points)
+
+
+def track_signature(table, n=SIGNATURE_POINTS):
+    # resample lat/lon at n evenly spaced distances along the track
+    lats = table["lat"]
+    lons = table["lon"]
+    dists = table["cum_dist_m"]
+    if len(lats) == 0:
+        return None
+
+    total = dists[-1]
+    sig_lat = []
+    sig_lon = []
+    j = 0
+    last = len(lats) - 1
+    for k in range(n):
+        target = total * k / (n - 1)
+        while j < last and dists[j + 1] < target:
+            j += 1
+        if j == last or dists[j + 1] == dists[j]:
+            sig_lat.append(lats[j])
+            sig_lon.append(lons[j])
+        else:
+            f = (target - dists[j]) / (dists[j + 1] - dists[j])
+            f = min(max(f, 0.0), 1.0)
+            sig_lat.append(lats[j] + f * (lats[j + 1] - lats[j]))
+            sig_lon.append(lons[j] + f * (lons[j + 1] - lons[j]))
+
+    return {"lat": sig_lat, "lon": sig_lon, "length_m": total}
+
+
+def _cell(lat, lon):
+    # grid cells about CELL_M wide; longitude cells are widened by 1/cos(lat)
+    # so they stay roughly square
+    size = math.degrees(CELL_M / R)
+    row = int(math.floor(lat / size))
+    lon_size = size / max(math.cos(math.radians(row * size)), 0.01)
+    return row, int(math.floor(lon / lon_size))
+
+
+def _neighbour_cells(lat, lon):
+    size = math.degrees(CELL_M / R)
+    cells = set()
+    for dlat in (-size, 0.0, size):
+        for dlon_m in (-CELL_M, 0.0, CELL_M):
+            dlon = math.degrees(dlon_m / (R * max(math.cos(math.radians(lat + dlat)), 0.01)))
+            cells.add(_cell(lat + dlat, lon + dlon))
+    return cells
+
+
+# ---------------------------------------------------------------------------
+# Banded discrete Frechet distance
+# ---------------------------------------------------------------------------
+
+def _planar(sig_a, sig_b):
+    # both signatures on the local plane of sig_a's start (see
+    # gpx_pipeline.local_xy), so the inner loop is plain dx*dx + dy*dy
+    lat0 = sig_a["lat"][0]
+    lon0 = sig_a["lon"][0]
+    ax, ay = local_xy(sig_a["lat"], sig_a["lon"], lat0, lon0)
+    bx, by = local_xy(sig_b["lat"], sig_b["lon"], lat0, lon0)
+    return ax, ay, bx, by
+
+
+def frechet_distance(sig_a, sig_b, band=BAND, limit=math.inf):
+    # Discrete Frechet distance in meters, only looking at pairs (i, j) with
+    # |i - j| <= band. Returns math.inf as soon as every path is already
+    # worse than limit.
+    ax, ay, bx, by = _planar(sig_a, sig_b)
+    n = len(ax)
+    m = len(bx)
+    inf = math.inf
+
+    prev = [inf] * m
+    for i in range(n):
+        curr = [inf] * m
+        lo = max(0, i - band)
+        hi = min(m - 1, i + band)
+        row_best = inf
+        xi = ax[i]
+        yi = ay[i]
+        for j in range(lo, hi + 1):
+            dx = xi - bx[j]
+            dy = yi - by[j]
+            d = math.sqrt(dx * dx + dy * dy)
+            if i == 0 and j == 0:
+                best = d
+            else:
+                best = prev[j]
+                if j > 0:
+                    if curr[j - 1] < best:
+                        best = curr[j - 1]
+                    if prev[j - 1] < best:
+                        best = prev[j - 1]
+                if d > best:
+                    best = d
+            curr[j] = best
+            if best < row_best:
+                row_best = best
+        if row_best > limit:
+            return inf
+        prev = curr
+    return prev[m - 1]
+
+
+def _reversed(sig):
+    return {"lat": sig["lat"][::-1], "lon": sig["lon"][::-1], "length_m": sig["length_m"]}
+
+
+# ---------------------------------------------------------------------------
+# The index
+# ---------------------------------------------------------------------------
+
+def new_match_index():
+    return {"signatures": {}, "cells": {}}
+
+
+def add_track(index, track_id, table=None, signature=None):
+    if signature is None:
+        signature = track_signature(table)
+    if signature is None:
+        return None
+    index["signatures"][track_id] = signature
+    # a trail can be ridden either way, so file it under both of its ends
+    for lat, lon in ((signature["lat"][0], signature["lon"][0]),
+                     (signature["lat"][-1], signature["lon"][-1])):
+        index["cells"].setdefault(_cell(lat, lon), set()).add(track_id)
+    return signature
+
+
+def match_candidates(index, signature):
+    found = set()
+    for cell in _neighbour_cells(signature["lat"][0], signature["lon"][0]):
+        found.update(index["cells"].get(cell, ()))
+
+    length = signature["length_m"]
+    low = length * (1 - LENGTH_TOLERANCE)
+    high = length * (1 + LENGTH_TOLERANCE)
+    signatures = index["signatures"]
+    return [tid for tid in found if low <= signatures[tid]["length_m"] <= high]
+
+
+def find_duplicates(index, table=None, signature=None, max_distance_m=MATCH_DISTANCE_M,
+                    band=BAND):
+    # [(track_id, frechet_m), ...] for stored tracks that follow the same
+    # trail (in either direction), closest first
+    if signature is None:
+        signature = track_signature(table)
+    if signature is None:
+        return []
+
+    matches = []
+    for tid in match_candidates(index, signature):
+        other = index["signatures"][tid]
+        d = frechet_distance(signature, other, band, max_distance_m)
+        if d > max_distance_m:
+            d = frechet_distance(signature, _reversed(other), band, max_distance_m)
+        if d <= max_distance_m:
+            matches.append((tid, d))
+    matches.sort(key=lambda item: item[1])
+    return matches
+
+
+def save_match_index(json_path, index):
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(index["signatures"], f)
+
+
+def load_match_index(json_path):
+    index = new_match_index()
+    with open(json_path, encoding="utf-8") as f:
+        for tid, signature in json.load(f).items():
+            add_track(index, tid, signature=signature)
+    return index
@@ -0,0 +1,245 @@
+# trail_readers.py
+# One way in for every track format. Each reader turns a file into a stream of
+# column chunks, the same {"lat", "lon", "ele", "time"} lists that
+# gpx_pipeline's columnar code uses, so TCX, GeoJSON or a plain lat/lon CSV go
+# through the same trail table, stats and writers as a GPX file.
+#
+#     for columns in iter_point_chunks("ride.tcx"):    # format sniffed from the file
+#         ...
+#     convert_track("ride.geojson", "ride.csv")
+#
+# New formats plug in with register_reader(name, sniff, read).
+
+import csv
+import json
+import xml.etree.ElementTree as ET
+
+import gpx_pipeline
+from gpx_pipeline import new_columns
+
+CHUNK_POINTS = 10000
+SNIFF_BYTES = 4096
+
+READERS = {}
+
+
+def register_reader(name, sniff, read):
+    # sniff(head) gets the first SNIFF_BYTES bytes of the file and returns
+    # True if it recognises the format; read(path, chunk_size) yields chunks
+    READERS[name] = (sniff, read)
+
+
+def detect_format(path):
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    head = head.lstrip(b"\xef\xbb\xbf").lstrip()
+    for name, (sniff, _) in READERS.items():
+        if sniff(head):
+            return name
+    raise ValueError("%s: unknown track format" % (path,))
+
+
+def iter_point_chunks(path, fmt=None, chunk_size=CHUNK_POINTS):
+    if fmt is None:
+        fmt = detect_format(path)
+    if fmt not in READERS:
+        raise ValueError("no reader registered for %r" % (fmt,))
+    return READERS[fmt][1](path, chunk_size)
+
+
+def _chunked(points, chunk_size):
+    # (lat, lon, ele, time) tuples -> column chunks
+    columns = new_columns()
+    for lat, lon, ele, time_text in points:
+        columns["lat"].append(lat)
+        columns["lon"].append(lon)
+        columns["ele"].append(ele)
+        columns["time"].append(time_text)
+        if len(columns["lat"]) >= chunk_size:
+            yield columns
+            columns = new_columns()
+    if columns["lat"]:
+        yield columns
+
+
+# ---------------------------------------------------------------------------
+# GPX
+# ---------------------------------------------------------------------------
+
+def _sniff_gpx(head):
+    return head.startswith(b"<") and b"<gpx" in head
+
+
+def read_gpx(path, chunk_size=CHUNK_POINTS):
+    points = gpx_pipeline.iter_gpx_points(path)
+    return _chunked(((p["lat"], p["lon"], p["ele"], p["time"]) for p in points), chunk_size)
+
+
+# ---------------------------------------------------------------------------
+# TCX (Garmin Training Center XML)
+# <Trackpoint><Time/><Position><LatitudeDegrees/><LongitudeDegrees/></Position>
+# <AltitudeMeters/></Trackpoint>
+# ---------------------------------------------------------------------------
+
+def _sniff_tcx(head):
+    return head.startswith(b"<") and b"<TrainingCenterDatabase" in head
+
+
+def _iter_tcx(path):
+    local = gpx_pipeline._local_name
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if local(elem.tag) != "Trackpoint":
+            continue
+        lat = lon = ele = time_text = None
+        for child in elem.iter():
+            name = local(child.tag)
+            if name == "LatitudeDegrees":
+                lat = child.text
+            elif name == "LongitudeDegrees":
+                lon = child.text
+            elif name == "AltitudeMeters":
+                ele = child.text
+            elif name == "Time":
+                time_text = child.text.strip() if child.text else None
+        elem.clear()
+        # trackpoints without a position (e.g. heart rate only) are skipped
+        if lat and lon:
+            yield float(lat), float(lon), (float(ele) if ele else None), time_text
+
+
+def read_tcx(path, chunk_size=CHUNK_POINTS):
+    return _chunked(_iter_tcx(path), chunk_size)
+
+
+# ---------------------------------------------------------------------------
+# GeoJSON: LineString / MultiLineString geometries, bare or inside a Feature
+# or FeatureCollection. Coordinates are [lon, lat] or [lon, lat, ele]; times
+# are taken from a "coordTimes" property when there is one.
+# ---------------------------------------------------------------------------
+
+def _sniff_geojson(head):
+    if head[:1] not in (b"{", b"["):
+        return False
+    return b'"coordinates"' in head or b'"FeatureCollection"' in head or b'"Feature"' in head
+
+
+def _iter_geojson(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    def lines(obj, times):
+        kind = obj.get("type")
+        if kind == "FeatureCollection":
+            for feature in obj.get("features", []):
+                yield from lines(feature, None)
+        elif kind == "Feature":
+            props = obj.get("properties") or {}
+            yield from lines(obj.get("geometry") or {}, props.get("coordTimes"))
+        elif kind == "LineString":
+            yield obj["coordinates"], times
+        elif kind == "MultiLineString":
+            for k, coords in enumerate(obj["coordinates"]):
+                yield coords, (times[k] if times else None)
+
+    for coords, times in lines(data, None):
+        for k, c in enumerate(coords):
+            ele = float(c[2]) if len(c) > 2 and c[2] is not None else None
+            time_text = times[k] if times and k < len(times) else None
+            yield float(c[1]), float(c[0]), ele, time_text
+
+
+def read_geojson(path, chunk_size=CHUNK_POINTS):
+    return _chunked(_iter_geojson(path), chunk_size)
+
+
+# ---------------------------------------------------------------------------
+# CSV with a header row naming the columns, e.g. a save_trail_csv() file or
+# a device export with latitude,longitude,altitude,timestamp
+# ---------------------------------------------------------------------------
+
+CSV_NAMES = {
+    "lat": ("lat", "latitude"),
+    "lon": ("lon", "lng", "long", "longitude"),
+    "ele": ("ele", "elevation", "alt", "altitude"),
+    "time": ("time", "timestamp", "datetime")
+}
+
+
+def _csv_columns(header):
+    lowered = [h.strip().lower() for h in header]
+    found = {}
+    for field, names in CSV_NAMES.items():
+        for name in names:
+            if name in lowered:
+                found[field] = lowered.index(name)
+                break
+    return found
+
+
+def _sniff_csv(head):
+    first_line = head.split(b"\n", 1)[0].decode("utf-8", "replace")
+    found = _csv_columns(next(csv.reader([first_line]), []))
+    return "lat" in found and "lon" in found
+
+
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        found = _csv_columns(next(reader, []))
+        lat_i = found["lat"]
+        lon_i = found["lon"]
+        ele_i = found.get("ele")
+        time_i = found.get("time")
+        for row in reader:
+            if not row or not row[lat_i] or not row[lon_i]:
+                continue
+            ele = row[ele_i] if ele_i is not None else ""
+            time_text = row[time_i] if time_i is not None else ""
+            yield float(row[lat_i]), float(row[lon_i]), (float(ele) if ele else None), (time_text or None)
+
+
+def read_csv(path, chunk_size=CHUNK_POINTS):
+    return _chunked(_iter_csv(path), chunk_size)
+
+
+register_reader("gpx", _sniff_gpx, read_gpx)
+register_reader("tcx", _sniff_tcx, read_tcx)
+register_reader("geojson", _sniff_geojson, read_geojson)
+register_reader("csv", _sniff_csv, read_csv)
+
+
+# ---------------------------------------------------------------------------
+# From chunks to the usual outputs
+# ---------------------------------------------------------------------------
+
+def trail_table_from_chunks(chunks):
+    # build the columnar trail table chunk by chunk, carrying the last point
+    # and the running totals across chunk borders
+    table = {name: [] for name in gpx_pipeline.TRAIL_HEADERS}
+    total_distance = 0.0
+    total_gain = 0.0
+    prev = None
+    for columns in chunks:
+        part, total_distance, total_gain = gpx_pipeline.build_trail_columns(
+            columns, prev, total_distance, total_gain, start_index=len(table["index"]))
+        for name in table:
+            table[name].extend(part[name])
+        prev = gpx_pipeline.table_last_point(part) or prev
+    return table, total_distance, total_gain
+
+
+def load_track_table(path, fmt=None):
+    # any registered format -> (table, total_distance, total_gain, avg_grade)
+    table, total_distance, total_gain = trail_table_from_chunks(iter_point_chunks(path, fmt))
+    avg_grade = (total_gain / total_distance) if total_distance > 0 else 0.0
+    return table, total_distance, total_gain, avg_grade
+
+
+def convert_track(path, csv_path, fmt=None):
+    table, total_distance, total_gain, avg_grade = load_track_table(path, fmt)
+    gpx_pipeline.save_trail_csv(csv_path, gpx_pipeline.table_to_rows(table))
+    return total_distance, total_gain, avg_grade
+
+
+def convert_track_to_gpx(path, gpx_path, fmt=None, name=None):
+    gpx_pipeline.write_gpx(gpx_path, iter_point_chunks(path, fmt), name)
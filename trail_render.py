@@ -0,0 +1,190 @@
+# trail_render.py
+# Pictures straight from columnar trail tables, without going through the CSV:
+#  - a density heatmap: every point of one or many tracks is dropped into a
+#    fixed width x height grid of counters, saved as a PNG or a .npy array
+#  - an elevation profile: ele against cum_dist_m, squeezed into a fixed number
+#    of distance bins so a million-point track becomes a few thousand values
+# PNG and NPY are both written by hand (zlib + struct) to stay standard-library only.
+
+import csv
+import math
+import struct
+import sys
+import zlib
+from array import array
+from collections import Counter
+
+
+# ---------------------------------------------------------------------------
+# Heatmap
+# ---------------------------------------------------------------------------
+
+def tables_bbox(tables):
+    # (min_lat, min_lon, max_lat, max_lon) over all the tables
+    min_lat = min_lon = math.inf
+    max_lat = max_lon = -math.inf
+    for table in tables:
+        if len(table["lat"]) == 0:
+            continue
+        min_lat = min(min_lat, min(table["lat"]))
+        max_lat = max(max_lat, max(table["lat"]))
+        min_lon = min(min_lon, min(table["lon"]))
+        max_lon = max(max_lon, max(table["lon"]))
+    if min_lat == math.inf:
+        return None
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def heatmap_grid(tables, width=512, height=512, bbox=None):
+    # Returns (grid, bbox). grid is a flat array of width*height counts, row 0
+    # at the top (north). Points outside bbox are left out.
+    if bbox is None:
+        bbox = tables_bbox(tables)
+    grid = array("I", bytes(4 * width * height))
+    if bbox is None:
+        return grid, bbox
+
+    min_lat, min_lon, max_lat, max_lon = bbox
+    x_scale = (width - 1) / (max_lon - min_lon) if max_lon > min_lon else 0.0
+    y_scale = (height - 1) / (max_lat - min_lat) if max_lat > min_lat else 0.0
+
+    # turn every point into one cell number, then let Counter (written in C)
+    # do the counting instead of a Python loop that bumps grid cells one by one
+    counts = Counter()
+    for table in tables:
+        counts.update(
+            (height - 1 - int((lat - min_lat) * y_scale)) * width + int((lon - min_lon) * x_scale)
+            for lat, lon in zip(table["lat"], table["lon"])
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        )
+    for cell, n in counts.items():
+        grid[cell] = n
+    return grid, bbox
+
+
+def grid_to_gray(grid, log_scale=True):
+    # 0..255 brightness for each cell, log scaled so quiet trails still show up
+    peak = max(grid) if len(grid) else 0
+    if peak == 0:
+        return bytes(len(grid))
+    if log_scale:
+        top = math.log1p(peak)
+        lookup = {n: int(255 * math.log1p(n) / top) for n in set(grid)}
+    else:
+        lookup = {n: int(255 * n / peak) for n in set(grid)}
+    return bytes(map(lookup.__getitem__, grid))
+
+
+def save_png_gray(png_path, pixels, width, height):
+    # 8-bit grayscale PNG; pixels is width*height bytes, row by row
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)  # filter type "none" for every row
+        raw += pixels[y * width:(y + 1) * width]
+
+    with open(png_path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(bytes(raw), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def save_heatmap_png(png_path, grid, width, height, log_scale=True):
+    save_png_gray(png_path, grid_to_gray(grid, log_scale), width, height)
+
+
+def save_grid_npy(npy_path, grid, width, height):
+    # the .npy format numpy.load() reads: magic, version, header dict, raw data
+    header = "{'descr': '<u4', 'fortran_order': False, 'shape': (%d, %d), }" % (height, width)
+    pad = 64 - (10 + len(header) + 1) % 64
+    header = header + " " * pad + "\n"
+
+    data = array("I", grid)
+    if sys.byteorder == "big":
+        data.byteswap()
+
+    with open(npy_path, "wb") as f:
+        f.write(b"\x93NUMPY\x01\x00")
+        f.write(struct.pack("<H", len(header)))
+        f.write(header.encode("latin1"))
+        data.tofile(f)
+
+
+# ---------------------------------------------------------------------------
+# Elevation profile
+# ---------------------------------------------------------------------------
+
+def elevation_profile(table, n_bins=1000):
+    # Split the distance range into n_bins equal bins and keep the min, mean
+    # and max elevation of the points in each. Empty bins are left out.
+    dists = table["cum_dist_m"]
+    eles = table["ele"]
+    profile = {"cum_dist_m": [], "ele": [], "ele_min": [], "ele_max": []}
+    if len(dists) == 0:
+        return profile
+
+    total = dists[-1]
+    bin_size = total / n_bins if total > 0 else 1.0
+
+    sums = [0.0] * n_bins
+    counts = [0] * n_bins
+    lows = [math.inf] * n_bins
+    highs = [-math.inf] * n_bins
+    last = n_bins - 1
+    for d, e in zip(dists, eles):
+        if e is None:
+            continue
+        b = int(d / bin_size)
+        if b > last:
+            b = last
+        sums[b] += e
+        counts[b] += 1
+        if e < lows[b]:
+            lows[b] = e
+        if e > highs[b]:
+            highs[b] = e
+
+    for b in range(n_bins):
+        if counts[b]:
+            profile["cum_dist_m"].append((b + 0.5) * bin_size)
+            profile["ele"].append(sums[b] / counts[b])
+            profile["ele_min"].append(lows[b])
+            profile["ele_max"].append(highs[b])
+    return profile
+
+
+def save_profile_csv(csv_path, profile):
+    headers = ["cum_dist_m", "ele", "ele_min", "ele_max"]
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(zip(*(profile[h] for h in headers)))
+
+
+def save_profile_png(png_path, profile, width=800, height=200):
+    # white area under the mean elevation line, on black
+    pixels = bytearray(width * height)
+    dists = profile["cum_dist_m"]
+    eles = profile["ele"]
+    if dists:
+        low = min(eles)
+        high = max(eles)
+        span = (high - low) or 1.0
+        max_d = dists[-1] or 1.0
+        tops = [height] * width
+        for d, e in zip(dists, eles):
+            x = min(width - 1, int(d / max_d * (width - 1)))
+            y = height - 1 - int((e - low) / span * (height - 1))
+            tops[x] = min(tops[x], y)
+        # fill columns no bin landed in with the column to their left
+        for x in range(1, width):
+            if tops[x] == height:
+                tops[x] = tops[x - 1]
+        for x, top in enumerate(tops):
+            for y in range(top, height):
+                pixels[y * width + x] = 255
+    save_png_gray(png_path, bytes(pixels), width, height)